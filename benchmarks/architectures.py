@@ -0,0 +1,87 @@
+import os
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "2"
+os.environ["CUDA_VISIBLE_DEVICES"] = ""
+
+import numpy as np  # noqa: E402
+import tensorflow as tf  # noqa: E402
+from keras.layers import Conv2D, Dense, SeparableConv2D  # noqa: E402
+from keras.models import Model  # noqa: E402
+
+from models import build_model  # noqa: E402
+from schemas import ARCHITECTURE_PRESETS, Architecture, Config, get_config  # noqa: E402
+
+
+def count_flops(model: Model) -> int:
+    # Multiplications-additions des convolutions et couches denses, comptées deux fois
+    flops = 0
+    for layer in model.layers:
+        if isinstance(layer, SeparableConv2D):
+            _, h, w, c_out = layer.output.shape
+            c_in = layer.input.shape[-1]
+            kh, kw = layer.kernel_size
+            flops += 2 * h * w * c_in * (kh * kw + c_out)
+        elif isinstance(layer, Conv2D):
+            _, h, w, c_out = layer.output.shape
+            c_in = layer.input.shape[-1]
+            kh, kw = layer.kernel_size
+            flops += 2 * h * w * kh * kw * c_in * c_out
+        elif isinstance(layer, Dense):
+            flops += 2 * layer.input.shape[-1] * layer.units
+    return flops
+
+
+def latency_ms(model: Model, input_shape: tuple[int, int, int], runs: int) -> float:
+    infer = tf.function(lambda x: model(x, training=False), input_signature=[tf.TensorSpec((1,) + input_shape)])
+    x = tf.constant(np.random.default_rng(0).integers(0, 2, size=(1,) + input_shape).astype(np.float32))
+    for _ in range(5):
+        infer(x)
+
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        infer(x).numpy()
+        latencies.append(time.perf_counter() - start)
+    return 1000 * float(np.percentile(latencies, 50))
+
+
+def test_accuracy(config: Config, epochs: int) -> float:
+    from common import generate_model
+    from data import get_train_val_datasets
+
+    train_gen, val_gen, test_gen = get_train_val_datasets(config)
+    model = generate_model(config)
+    model.fit(train_gen, steps_per_epoch=len(train_gen), epochs=epochs, verbose=0)
+    _, accuracy = model.evaluate(test_gen, steps=len(test_gen), verbose=0)
+    return accuracy
+
+
+def main() -> None:
+    parser = ArgumentParser()
+    parser.add_argument("config_path", nargs="?", default="config.yaml", type=Path)
+    parser.add_argument("--runs", default=200, type=int)
+    parser.add_argument(
+        "--epochs", default=0, type=int, help="Train each preset on the generated dataset to report test accuracy"
+    )
+    args = parser.parse_args()
+
+    config = get_config(args.config_path)
+    input_shape = config.input_shape
+
+    print(f"{'preset':<10}{'params':>12}{'MFLOPs':>10}{'p50 ms':>10}{'accuracy':>10}")
+    for preset in ARCHITECTURE_PRESETS:
+        preset_config = config.model_copy(update={"architecture": Architecture(preset=preset)})
+        model = build_model(preset_config)
+        accuracy = f"{100 * test_accuracy(preset_config, args.epochs):.2f}%" if args.epochs > 0 else "-"
+        print(
+            f"{preset:<10}{model.count_params():>12,}{count_flops(model) / 1e6:>10.1f}"
+            f"{latency_ms(model, input_shape, args.runs):>10.2f}{accuracy:>10}"
+        )
+        tf.keras.backend.clear_session()
+
+
+if __name__ == "__main__":
+    main()
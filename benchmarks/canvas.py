@@ -0,0 +1,66 @@
+import os
+import time
+from argparse import ArgumentParser
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "1"
+
+import numpy as np  # noqa: E402
+import pygame  # noqa: E402
+
+from canvas import Canvas  # noqa: E402
+
+
+def stroke(win_size: int, n_points: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    steps = rng.integers(-12, 13, size=(n_points, 2))
+    return np.clip(win_size // 2 + np.cumsum(steps, axis=0), 0, win_size - 1)
+
+
+def full_frame_ms(canvas: Canvas, screen: pygame.Surface, points: np.ndarray, brush_size: int) -> float:
+    start = time.perf_counter()
+    for p_start, p_end in zip(points[:-1], points[1:]):
+        canvas.stamp_segment(tuple(p_start), tuple(p_end), brush_size)
+        screen.blit(pygame.surfarray.make_surface(canvas.pixels), (0, 0))
+        pygame.display.flip()
+    return 1000 * (time.perf_counter() - start) / (len(points) - 1)
+
+
+def dirty_rect_frame_ms(canvas: Canvas, screen: pygame.Surface, points: np.ndarray, brush_size: int) -> float:
+    surface = pygame.Surface(screen.get_size(), depth=8)
+    surface.set_palette([(i, i, i) for i in range(256)])
+    pygame.surfarray.blit_array(surface, canvas.pixels)
+
+    start = time.perf_counter()
+    for p_start, p_end in zip(points[:-1], points[1:]):
+        rect = canvas.stamp_segment(tuple(p_start), tuple(p_end), brush_size)
+        if rect is None:
+            continue
+        x, y, w, h = rect
+        pygame.surfarray.blit_array(surface.subsurface(rect), canvas.pixels[x : x + w, y : y + h])
+        screen.blit(surface, rect, rect)
+        pygame.display.update([rect])
+    return 1000 * (time.perf_counter() - start) / (len(points) - 1)
+
+
+def main() -> None:
+    parser = ArgumentParser()
+    parser.add_argument("--window-sizes", type=int, nargs="+", default=[640, 1280, 2048])
+    parser.add_argument("--brush-sizes", type=int, nargs="+", default=[3, 10, 40])
+    parser.add_argument("--points", type=int, default=300)
+    args = parser.parse_args()
+
+    pygame.init()
+    print(f"{'window':>8}{'brush':>8}{'full frame ms':>16}{'dirty rect ms':>16}")
+    for win_size in args.window_sizes:
+        screen = pygame.display.set_mode((win_size, win_size))
+        points = stroke(win_size, args.points)
+        for brush_size in args.brush_sizes:
+            full = full_frame_ms(Canvas(win_size, win_size), screen, points, brush_size)
+            dirty = dirty_rect_frame_ms(Canvas(win_size, win_size), screen, points, brush_size)
+            print(f"{win_size:>8}{brush_size:>8}{full:>16.3f}{dirty:>16.3f}")
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
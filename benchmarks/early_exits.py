@@ -0,0 +1,87 @@
+import math
+import os
+import tempfile
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "2"
+os.environ["CUDA_VISIBLE_DEVICES"] = ""
+
+import numpy as np  # noqa: E402
+
+from data import get_train_val_datasets, iter_batches  # noqa: E402
+from inference import ModelManager  # noqa: E402
+from schemas import Config, EarlyExits, get_config  # noqa: E402
+
+
+def train_weights(config: Config, epochs: int, weights_path: Path) -> None:
+    from common import generate_model
+
+    train_gen, _, _ = get_train_val_datasets(config)
+    model = generate_model(config)
+    model.fit(train_gen, steps_per_epoch=len(train_gen), epochs=epochs, verbose=0)
+    model.save_weights(weights_path)
+
+
+def test_samples(config: Config, max_samples: int) -> tuple[np.ndarray, np.ndarray]:
+    _, _, test_gen = get_train_val_datasets(config)
+    xs, ys = zip(*iter_batches(test_gen))
+    return np.concatenate(xs)[:max_samples], np.concatenate(ys)[:max_samples].astype(np.int64)
+
+
+def measure(model_manager: ModelManager, x: np.ndarray, y: np.ndarray, threshold: float) -> tuple[float, np.ndarray]:
+    model_manager.exit_threshold = threshold
+    model_manager.exit_counts[:] = 0
+
+    # Un dessin à la fois, comme dans l'interface : la latence suit l'étage de sortie de chaque dessin
+    latencies, correct = [], 0
+    for arr, label in zip(x, y):
+        start = time.perf_counter()
+        output = model_manager._infer(arr[np.newaxis])[0]
+        latencies.append(time.perf_counter() - start)
+        correct += int(np.argmax(output) == label)
+
+    return correct / len(y), np.array(latencies) * 1000
+
+
+def main() -> None:
+    parser = ArgumentParser()
+    parser.add_argument("model_path", nargs="?", default=None, type=Path)
+    parser.add_argument("config_path", nargs="?", default="config.yaml", type=Path)
+    parser.add_argument("--thresholds", nargs="+", default=[0.5, 0.7, 0.8, 0.9, 0.95, 0.99], type=float)
+    parser.add_argument("--samples", default=500, type=int, help="Test drawings predicted for each threshold")
+    parser.add_argument(
+        "--epochs", default=0, type=int, help="Without a model, train one on the generated dataset for this many epochs"
+    )
+    args = parser.parse_args()
+
+    config = get_config(args.config_path)
+    if config.early_exits is None:
+        config.early_exits = EarlyExits()
+
+    with tempfile.TemporaryDirectory() as folder:
+        model_path = args.model_path
+        if model_path is None and args.epochs > 0:
+            model_path = Path(folder) / "early_exits.h5"
+            train_weights(config, args.epochs, model_path)
+
+        model_manager = ModelManager(model_path, config)
+        x, y = test_samples(config, args.samples)
+
+        exit_names = model_manager.model.output_names
+        usage_header = "".join(f"{name:>9}" for name in exit_names)
+        print(f"{'threshold':<12}{'accuracy':>10}{'stages':>8}{'p50 ms':>8}{'mean ms':>9}{usage_header}")
+        # Référence sans sortie anticipée : un seuil jamais atteint fait passer chaque dessin par tous les étages
+        for label, threshold in [("full depth", math.inf)] + [(f"{t:g}", t) for t in args.thresholds]:
+            accuracy, latencies = measure(model_manager, x, y, threshold)
+            stats = model_manager.exit_stats()
+            usage = "".join(f"{100 * stats['usage'][name]:>8.1f}%" for name in exit_names)
+            print(
+                f"{label:<12}{100 * accuracy:>9.2f}%{stats['mean_stages']:>8.2f}"
+                f"{np.percentile(latencies, 50):>8.2f}{latencies.mean():>9.2f}{usage}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+import numpy as np
+
+from raster import SOURCE_SIZE, Strokes
+
+
+def random_strokes(n_drawings: int, seed: int = 0) -> list[Strokes]:
+    # Marches aléatoires dans le carré QuickDraw, proches en taille des dessins simplifiés
+    rng = np.random.default_rng(seed)
+    drawings = []
+
+    for _ in range(n_drawings):
+        strokes = []
+        for _ in range(rng.integers(1, 8)):
+            start = rng.integers(0, SOURCE_SIZE, size=2)
+            steps = rng.integers(-40, 41, size=(rng.integers(2, 20), 2))
+            points = np.clip(start + np.cumsum(steps, axis=0), 0, SOURCE_SIZE - 1)
+            strokes.append([(int(x), int(y)) for x, y in points])
+        drawings.append(strokes)
+
+    return drawings
@@ -0,0 +1,63 @@
+import subprocess
+import sys
+from argparse import ArgumentParser
+
+# Modules d'entraînement qui ne doivent pas être chargés au démarrage de l'interface ou du serveur
+FORBIDDEN_MODULES = ("tensorflow", "keras", "matplotlib", "sklearn", "focal_loss", "quickdraw", "wandb")
+
+ENTRY_POINTS = {"quick_draw": 1000.0, "serve": 800.0}
+
+
+def import_times(module: str) -> dict[str, tuple[int, int]]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True, check=True
+    )
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        # Le niveau d'imbrication est donné par l'indentation du nom
+        depth = (len(name) - len(name.lstrip())) // 2
+        times[name.strip()] = (int(cumulative_us), depth)
+
+    return times
+
+
+def check(module: str, budget_ms: float) -> list[str]:
+    times = import_times(module)
+    total_ms = sum(cumulative for cumulative, depth in times.values() if depth == 0) / 1000
+    errors = []
+
+    loaded = sorted(name for name in times if name.split(".")[0] in FORBIDDEN_MODULES and "." not in name)
+    if loaded:
+        errors.append(f"{module} imports {', '.join(loaded)}")
+    if total_ms > budget_ms:
+        errors.append(f"{module} takes {total_ms:.0f} ms to import, over the {budget_ms:.0f} ms budget")
+
+    slowest = sorted(((cumulative, name) for name, (cumulative, depth) in times.items() if depth == 1), reverse=True)
+    print(f"{module}: {total_ms:.0f} ms (budget {budget_ms:.0f} ms)")
+    for cumulative, name in slowest[:5]:
+        print(f"  {cumulative / 1000:>8.1f} ms  {name}")
+
+    return errors
+
+
+def main() -> None:
+    parser = ArgumentParser()
+    parser.add_argument("modules", nargs="*", default=list(ENTRY_POINTS))
+    parser.add_argument("--budget-ms", type=float, default=None, help="Overrides the budget of every entry point")
+    args = parser.parse_args()
+
+    errors = []
+    for module in args.modules:
+        errors += check(module, args.budget_ms or ENTRY_POINTS.get(module, 1000.0))
+
+    for error in errors:
+        print(f"FAILED: {error}")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import os
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "2"
+
+import numpy as np  # noqa: E402
+from tensorflow import argmax, reduce_max  # noqa: E402
+
+from inference import ModelManager  # noqa: E402
+from schemas import get_config  # noqa: E402
+
+
+def keras_predict(model_manager: ModelManager, arr: np.ndarray) -> tuple[str, float]:
+    # Chemin d'origine : boucle model.predict complète et post-traitement en opérations TF
+    output = model_manager.model.predict(arr[np.newaxis], verbose=0)
+    output_idx = reduce_max(argmax(output, axis=1))
+    return model_manager.class_names[output_idx], output[:, output_idx][0] * 100
+
+
+def measure(predict, inputs: np.ndarray) -> np.ndarray:
+    latencies = []
+    for arr in inputs:
+        start = time.perf_counter()
+        predict(arr)
+        latencies.append(time.perf_counter() - start)
+    return np.array(latencies) * 1000
+
+
+def main() -> None:
+    parser = ArgumentParser()
+    parser.add_argument("model_path", nargs="?", default=None, type=Path)
+    parser.add_argument("config_path", nargs="?", default="config.yaml", type=Path)
+    parser.add_argument("--samples", type=int, default=200)
+    args = parser.parse_args()
+
+    config = get_config(args.config_path)
+    rng = np.random.default_rng(0)
+    inputs = rng.integers(0, 2, size=(args.samples, config.image_size[1], config.image_size[0], 1)).astype(np.float32)
+
+    print(f"{'path':<22}{'load + first ms':>17}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, jit_compile, use_keras in [("model.predict", False, True), ("fast", False, False), ("fast (jit)", True, False)]:
+        start = time.perf_counter()
+        model_manager = ModelManager(args.model_path, config, jit_compile=jit_compile)
+        predict = (lambda arr: keras_predict(model_manager, arr)) if use_keras else model_manager.predict_array
+        predict(inputs[0])
+        first_call = 1000 * (time.perf_counter() - start)
+
+        latencies = measure(predict, inputs)
+        print(f"{name:<22}{first_call:>17.1f}{np.percentile(latencies, 50):>10.2f}{np.percentile(latencies, 99):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
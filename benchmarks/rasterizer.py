@@ -0,0 +1,38 @@
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+
+from benchmarks.fixtures import random_strokes
+from raster import rasterize_strokes, render_strokes_pil
+
+
+def main() -> None:
+    parser = ArgumentParser()
+    parser.add_argument("--drawings", type=int, default=5000)
+    parser.add_argument("--image-size", type=int, nargs=2, default=(28, 28))
+    parser.add_argument("--stroke-width", type=int, default=1)
+    args = parser.parse_args()
+
+    image_size = tuple(args.image_size)
+    drawings = random_strokes(args.drawings)
+
+    start = time.perf_counter()
+    pil_images = render_strokes_pil(drawings, image_size)
+    pil_time = time.perf_counter() - start
+
+    out = np.empty((len(drawings), image_size[1], image_size[0]), dtype=np.uint8)
+    start = time.perf_counter()
+    numpy_images = rasterize_strokes(drawings, image_size, stroke_width=args.stroke_width, out=out)
+    numpy_time = time.perf_counter() - start
+
+    print(f"{'renderer':<10}{'drawings/s':>14}{'ms/drawing':>14}")
+    for renderer, elapsed in [("pil", pil_time), ("numpy", numpy_time)]:
+        print(f"{renderer:<10}{len(drawings) / elapsed:>14.0f}{1000 * elapsed / len(drawings):>14.4f}")
+
+    print(f"Speedup: x{pil_time / numpy_time:.1f}")
+    print(f"Pixel agreement with the PIL path: {100 * np.mean(pil_images == numpy_images):.2f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+import os
+
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "2"
+os.environ["CUDA_VISIBLE_DEVICES"] = ""
+
+import json  # noqa: E402
+import platform  # noqa: E402
+import sys  # noqa: E402
+import tempfile  # noqa: E402
+import time  # noqa: E402
+from argparse import ArgumentParser  # noqa: E402
+from functools import partial  # noqa: E402
+from itertools import islice  # noqa: E402
+from pathlib import Path  # noqa: E402
+
+import numpy as np  # noqa: E402
+
+from benchmarks.fixtures import random_strokes  # noqa: E402
+from canvas import Canvas  # noqa: E402
+from schemas import Config, RawData, get_config  # noqa: E402
+
+BENCHMARKS = ["render", "input", "train", "inference"]
+
+# Sens d'amélioration de chaque mesure, utilisé pour détecter les régressions
+HIGHER_IS_BETTER = ("_per_s",)
+
+
+def reference_ms(runs: int = 5) -> float:
+    # Calcul fixe chronométré dans la même exécution : les mesures sont comparées à la référence en proportion de
+    # ce temps, pour que la référence mesurée sur une autre machine reste utilisable
+    rng = np.random.default_rng(0)
+    values = rng.random(1_000_000)
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        np.sort(values)
+        sum(i * i for i in range(300_000))
+        timings.append(time.perf_counter() - start)
+
+    return 1000 * min(timings)
+
+
+def bench_render(config: Config, n_drawings: int, n_classes: int, samples_per_class: int) -> dict[str, float]:
+    from data import generate_data, render_drawings
+    from rawdata import RawDataStore, write_fixtures
+
+    drawings = random_strokes(n_drawings)
+    results = {}
+    for renderer in ["pil", "numpy"]:
+        start = time.perf_counter()
+        render_drawings(drawings, config.image_size, renderer, config.data.stroke_width)
+        elapsed = time.perf_counter() - start
+        results[f"render_{renderer}_drawings_per_s"] = n_drawings / elapsed
+
+    # Génération complète d'un jeu de données depuis des fichiers bruts factices : lecture du cache, rendu, écriture
+    # des fichiers, du manifeste et de l'index des formats empaquetés
+    with tempfile.TemporaryDirectory() as folder:
+        class_names = sorted(config.data.classes)[:n_classes]
+        write_fixtures(Path(folder) / "raw", class_names, samples_per_class)
+        raw_data = RawData(cache_folder=Path(folder) / "cache", base_url=(Path(folder) / "raw").as_uri())
+        RawDataStore.from_config(raw_data).prefetch(class_names)
+
+        num_train = samples_per_class * 8 // 10
+        num_val = (samples_per_class - num_train) // 2
+        for data_format in ["png", "packed"]:
+            data = config.data.model_copy(
+                update={
+                    "folder": Path(folder) / data_format,
+                    "generate": True,
+                    "format": data_format,
+                    "train_samples": num_train,
+                    "validation_samples": num_val,
+                    "test_samples": samples_per_class - num_train - num_val,
+                    "workers": 1,
+                    "classes": class_names,
+                }
+            )
+            start = time.perf_counter()
+            generate_data(config.model_copy(update={"data": data, "raw_data": raw_data}))
+            elapsed = time.perf_counter() - start
+            results[f"generate_{data_format}_drawings_per_s"] = n_classes * samples_per_class / elapsed
+
+    return results
+
+
+def prepare_dataset(config: Config, folder: Path, n_classes: int, samples_per_class: int) -> None:
+    from data import render_drawings, save_class_images, write_packed_index
+
+    class_names = sorted(config.data.classes)[:n_classes]
+    num_train = samples_per_class * 8 // 10
+    num_val = (samples_per_class - num_train) // 2
+
+    for label, name in enumerate(class_names):
+        images = render_drawings(random_strokes(samples_per_class, seed=label), config.image_size, "numpy", 1)
+        key_ids = [str(i) for i in range(samples_per_class)]
+        save_class_images(folder, name, images, key_ids, num_train, num_val, config.data.format, label)
+
+    if config.data.format == "packed":
+        write_packed_index(folder, class_names, config.input_shape[:2])
+
+    config.data.folder = folder
+    config.data.classes = class_names
+
+
+def bench_input(config: Config, n_classes: int, samples_per_class: int, max_batches: int) -> dict[str, float]:
+    from data import get_train_val_datasets, iter_batches
+
+    results = {}
+    for data_format in ["png", "packed"]:
+        with tempfile.TemporaryDirectory() as folder:
+            config = config.model_copy(deep=True)
+            config.data.format = data_format
+            prepare_dataset(config, Path(folder), n_classes, samples_per_class)
+
+            for loader in ["keras", "tf_data"]:
+                config.data.loader = loader
+                train, _, _ = get_train_val_datasets(config)
+
+                batches = iter_batches(train)
+                next(batches)
+                start = time.perf_counter()
+                n_batches = sum(1 for _ in islice(batches, max_batches))
+                results[f"input_{data_format}_{loader}_batches_per_s"] = n_batches / (time.perf_counter() - start)
+
+    return results
+
+
+def bench_train(config: Config, steps: int) -> dict[str, float]:
+    from common import generate_model
+
+    model = generate_model(config)
+    rng = np.random.default_rng(0)
+    batch_size = config.data.batch_size
+    x = rng.integers(0, 2, size=(batch_size,) + config.input_shape).astype(np.float32)
+    y = rng.integers(0, len(config.data.classes), size=batch_size).astype(np.float32)
+
+    for _ in range(2):
+        model.train_on_batch(x, y)
+
+    start = time.perf_counter()
+    for _ in range(steps):
+        model.train_on_batch(x, y)
+    elapsed = time.perf_counter() - start
+
+    return {"train_step_ms": 1000 * elapsed / steps, "train_samples_per_s": steps * batch_size / elapsed}
+
+
+def bench_inference(config: Config, runs: int) -> dict[str, float]:
+    from inference import ModelManager
+
+    model_manager = ModelManager(None, config)
+    strokes = [[(120, 140), (480, 420), (200, 500)]]
+    canvas = Canvas(640, 640)
+    canvas.stamp_segment((120, 140), (480, 420), 3)
+    canvas.stamp_segment((480, 420), (200, 500), 3)
+
+    # Un modèle de séquences lit les traits du dessin plutôt que ses pixels
+    if model_manager.uses_strokes:
+        predict = partial(model_manager.predict_strokes, strokes)
+        sample = model_manager.preprocess_strokes(strokes)
+    else:
+        predict = partial(model_manager.predict, canvas.pixels, canvas.bbox)
+        sample = model_manager.preprocess(canvas.pixels, canvas.bbox)
+
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        predict()
+        latencies.append(time.perf_counter() - start)
+
+    batch = np.stack([sample] * config.data.batch_size)
+    model_manager.predict_batch(batch)
+    start = time.perf_counter()
+    for _ in range(max(1, runs // 10)):
+        model_manager.predict_batch(batch)
+    batch_ms = 1000 * (time.perf_counter() - start) / max(1, runs // 10)
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "predict_p50_ms": float(np.percentile(latencies_ms, 50)),
+        "predict_p99_ms": float(np.percentile(latencies_ms, 99)),
+        "predict_batch_ms": batch_ms,
+        "predict_batch_samples_per_s": 1000 * len(batch) / batch_ms,
+    }
+
+
+def compare(results: dict[str, float], baseline: dict[str, float], speedup: float, threshold: float) -> list[str]:
+    # speedup : rapport des temps de l'étape de référence entre la machine de la référence et celle-ci
+    regressions = []
+    print(f"Reference step {speedup:.2f}x as fast as on the baseline machine, baseline values scaled accordingly")
+    print(f"{'metric':<40}{'baseline':>12}{'current':>12}{'change':>9}")
+
+    for name, value in results.items():
+        if name not in baseline:
+            print(f"{name:<40}{'-':>12}{value:>12.3f}")
+            continue
+
+        # Une mesure nulle dans la référence (débit d'une étape sautée) n'a pas de variation relative
+        if baseline[name] == 0:
+            print(f"{name:<40}{baseline[name]:>12.3f}{value:>12.3f}{'-':>9}")
+            continue
+
+        higher_is_better = name.endswith(HIGHER_IS_BETTER)
+        expected = baseline[name] * speedup if higher_is_better else baseline[name] / speedup
+        change = (value - expected) / expected
+        regressed = change < -threshold if higher_is_better else change > threshold
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:<40}{expected:>12.3f}{value:>12.3f}{100 * change:>+8.1f}%{flag}")
+
+        if regressed:
+            regressions.append(name)
+
+    return regressions
+
+
+def main() -> None:
+    parser = ArgumentParser()
+    parser.add_argument("config_path", nargs="?", default="config.yaml", type=Path)
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=BENCHMARKS)
+    parser.add_argument("--output", default=None, type=Path, help="Write the results as JSON")
+    parser.add_argument("--baseline", default=Path("benchmarks/baseline.json"), type=Path)
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--threshold", default=0.1, type=float, help="Relative change flagged as a regression")
+    parser.add_argument("--drawings", default=2000, type=int)
+    parser.add_argument("--classes", default=4, type=int)
+    parser.add_argument("--samples-per-class", default=500, type=int)
+    parser.add_argument("--max-batches", default=50, type=int)
+    parser.add_argument("--train-steps", default=20, type=int)
+    parser.add_argument("--inference-runs", default=100, type=int)
+    args = parser.parse_args()
+
+    config = get_config(args.config_path)
+
+    step_ms = reference_ms()
+    results: dict[str, float] = {}
+    if "render" in args.only:
+        results.update(bench_render(config, args.drawings, args.classes, args.samples_per_class))
+    if "input" in args.only:
+        results.update(bench_input(config, args.classes, args.samples_per_class, args.max_batches))
+    if "train" in args.only:
+        results.update(bench_train(config, args.train_steps))
+    if "inference" in args.only:
+        results.update(bench_inference(config, args.inference_runs))
+
+    report = {
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "reference_ms": step_ms,
+        "results": results,
+    }
+    if args.output is not None:
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+
+    baseline, baseline_step_ms = {}, step_ms
+    if args.baseline.exists():
+        baseline_report = json.loads(args.baseline.read_text())
+        baseline, baseline_step_ms = baseline_report["results"], baseline_report.get("reference_ms", step_ms)
+    regressions = compare(results, baseline, baseline_step_ms / step_ms, args.threshold)
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"Baseline saved to {args.baseline}")
+    elif regressions:
+        print(f"{len(regressions)} regression(s) beyond {100 * args.threshold:.0f}%: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import json
+import threading
+import time
+import urllib.request
+from argparse import ArgumentParser
+
+import numpy as np
+
+from benchmarks.fixtures import random_strokes
+
+
+def to_quickdraw_format(strokes: list[list[tuple[int, int]]]) -> list[list[list[int]]]:
+    return [[[x for x, _ in stroke], [y for _, y in stroke]] for stroke in strokes]
+
+
+def post(url: str, payload: dict) -> dict:
+    request = urllib.request.Request(
+        url, data=json.dumps(payload).encode(), headers={"Content-Type": "application/json"}, method="POST"
+    )
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def main() -> None:
+    parser = ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    drawings = [{"drawing": to_quickdraw_format(strokes)} for strokes in random_strokes(256)]
+    latencies: list[float] = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+
+    def client(seed: int) -> None:
+        rng = np.random.default_rng(seed)
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            post(f"{args.url}/predict", drawings[rng.integers(len(drawings))])
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client, args=(seed,)) for seed in range(args.clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000
+    print(f"Clients: {args.clients} - requests: {len(latencies)} - throughput: {len(latencies) / elapsed:.1f} req/s")
+    print(f"Latency p50: {np.percentile(latencies_ms, 50):.1f} ms - p99: {np.percentile(latencies_ms, 99):.1f} ms")
+
+    with urllib.request.urlopen(f"{args.url}/stats") as response:
+        print(json.dumps(json.loads(response.read()), indent=2))
+
+
+if __name__ == "__main__":
+    main()
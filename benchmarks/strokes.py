@@ -0,0 +1,83 @@
+import io
+import os
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "2"
+os.environ["CUDA_VISIBLE_DEVICES"] = ""
+
+import numpy as np  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from benchmarks.fixtures import random_strokes  # noqa: E402
+from canvas import Canvas  # noqa: E402
+from inference import ModelManager  # noqa: E402
+from raster import rasterize_strokes  # noqa: E402
+from schemas import get_config  # noqa: E402
+
+
+def p50_ms(function, inputs: list) -> float:
+    function(inputs[0])
+    latencies = []
+    for item in inputs:
+        start = time.perf_counter()
+        function(item)
+        latencies.append(time.perf_counter() - start)
+    return 1000 * float(np.percentile(latencies, 50))
+
+
+def main() -> None:
+    parser = ArgumentParser()
+    parser.add_argument("config_path", nargs="?", default="config.yaml", type=Path)
+    parser.add_argument("--drawings", default=200, type=int)
+    args = parser.parse_args()
+
+    config = get_config(args.config_path)
+    drawings = random_strokes(args.drawings)
+
+    raster_config = config.model_copy(deep=True)
+    raster_config.data.format = "packed"
+    stroke_config = config.model_copy(deep=True)
+    stroke_config.data.format = "strokes"
+
+    # Octets stockés par dessin pour chaque format du jeu de données
+    images = rasterize_strokes(drawings, config.image_size)
+    png_bytes = []
+    for image in images:
+        buffer = io.BytesIO()
+        Image.fromarray(image).save(buffer, format="png")
+        png_bytes.append(buffer.tell())
+    sizes = {
+        "png": float(np.mean(png_bytes)),
+        "packed": float(np.ceil(images[0].size / 8)),
+        "strokes": float(np.prod(stroke_config.input_shape) * 2),
+    }
+
+    # Les traits passent par le canevas de l'interface pour l'image, directement pour les séquences
+    canvases = [Canvas.from_strokes([[[x for x, _ in s], [y for _, y in s]] for s in strokes]) for strokes in drawings]
+
+    print(f"{'model':<22}{'params':>12}{'weights MB':>12}{'input KB':>10}{'bytes/drawing':>15}{'prep ms':>10}{'p50 ms':>10}")
+    for name, model_config in [("raster", raster_config), ("strokes", stroke_config)]:
+        model_manager = ModelManager(None, model_config)
+        params = model_manager.model.count_params()
+
+        if name == "raster":
+            preprocess = lambda canvas: model_manager.preprocess(canvas.pixels, canvas.bbox)  # noqa: E731
+            inputs, stored = canvases, f"{sizes['png']:.0f} / {sizes['packed']:.0f}"
+        else:
+            preprocess = model_manager.preprocess_strokes
+            inputs, stored = drawings, f"{sizes['strokes']:.0f}"
+
+        arrays = [preprocess(item) for item in inputs]
+        print(
+            f"{model_manager.model.name:<22}{params:>12,}{4 * params / 2**20:>12.2f}"
+            f"{4 * np.prod(model_config.input_shape) / 2**10:>10.2f}{stored:>15}"
+            f"{p50_ms(preprocess, inputs):>10.3f}{p50_ms(model_manager.predict_array, arrays):>10.2f}"
+        )
+
+    print("bytes/drawing for raster: png / packed")
+
+
+if __name__ == "__main__":
+    main()
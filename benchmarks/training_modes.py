@@ -0,0 +1,93 @@
+import os
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "2"
+os.environ["CUDA_VISIBLE_DEVICES"] = ""
+
+import numpy as np  # noqa: E402
+import tensorflow as tf  # noqa: E402
+from keras import mixed_precision  # noqa: E402
+
+from common import generate_model  # noqa: E402
+from schemas import Config, Training, get_config  # noqa: E402
+
+
+def training_modes(steps_per_execution: int) -> dict[str, Training]:
+    return {
+        "float32": Training(),
+        "xla": Training(jit_compile=True),
+        f"steps_per_execution={steps_per_execution}": Training(steps_per_execution=steps_per_execution),
+        "mixed_bfloat16": Training(precision="mixed_bfloat16"),
+        "xla+bf16+spe": Training(
+            jit_compile=True, precision="mixed_bfloat16", steps_per_execution=steps_per_execution
+        ),
+    }
+
+
+def step_time_ms(config: Config, steps: int) -> float:
+    # Lots synthétiques en mémoire : seul le pas d'entraînement est mesuré
+    rng = np.random.default_rng(0)
+    batch_size = config.data.batch_size
+    x = rng.integers(0, 2, size=(batch_size,) + config.input_shape).astype(np.float32)
+    y = rng.integers(0, len(config.data.classes), size=batch_size).astype(np.float32)
+    dataset = tf.data.Dataset.from_tensors((x, y)).repeat()
+
+    model = generate_model(config)
+    # Premier passage pour la compilation du graphe (et XLA)
+    model.fit(dataset, steps_per_epoch=steps, epochs=1, verbose=0)
+
+    start = time.perf_counter()
+    model.fit(dataset, steps_per_epoch=steps, epochs=1, verbose=0)
+    return 1000 * (time.perf_counter() - start) / steps
+
+
+def test_metrics(config: Config, epochs: int) -> tuple[float, float]:
+    from data import get_train_val_datasets
+    from evaluation import evaluate_model
+
+    train_gen, _, test_gen = get_train_val_datasets(config)
+    model = generate_model(config)
+    model.fit(train_gen, steps_per_epoch=len(train_gen), epochs=epochs, verbose=0)
+    metrics = evaluate_model(model, test_gen, sorted(config.data.classes))
+    return metrics.loss, metrics.accuracy
+
+
+def main() -> None:
+    parser = ArgumentParser()
+    parser.add_argument("config_path", nargs="?", default="config.yaml", type=Path)
+    parser.add_argument("--steps", default=50, type=int, help="Training steps timed for each mode")
+    parser.add_argument("--steps-per-execution", default=8, type=int)
+    parser.add_argument("--loss", default=None, choices=["focal", "cross_entropy"], help="Defaults to the config's")
+    parser.add_argument(
+        "--epochs", default=0, type=int, help="Train each mode on the generated dataset to report test accuracy"
+    )
+    args = parser.parse_args()
+
+    config = get_config(args.config_path)
+    if args.loss is not None and args.loss != config.loss_name:
+        config.loss_name = args.loss
+        config.loss_parameters = {"gamma": 2.0} if args.loss == "focal" else None
+
+    print(f"loss: {config.loss_name}, batch size: {config.data.batch_size}, model: {config.architecture.preset}")
+    print(f"{'mode':<24}{'ms/step':>10}{'speedup':>10}{'test loss':>12}{'accuracy':>10}")
+    baseline = None
+    for name, training in training_modes(args.steps_per_execution).items():
+        mode_config = config.model_copy(update={"training": training})
+        milliseconds = step_time_ms(mode_config, args.steps)
+        baseline = baseline or milliseconds
+
+        loss, accuracy = "-", "-"
+        if args.epochs > 0:
+            test_loss, test_accuracy = test_metrics(mode_config, args.epochs)
+            loss, accuracy = f"{test_loss:.4f}", f"{100 * test_accuracy:.2f}%"
+
+        print(f"{name:<24}{milliseconds:>10.2f}{baseline / milliseconds:>9.2f}x{loss:>12}{accuracy:>10}")
+        tf.keras.backend.clear_session()
+
+    mixed_precision.set_global_policy("float32")
+
+
+if __name__ == "__main__":
+    main()
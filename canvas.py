@@ -0,0 +1,103 @@
+import numpy as np
+
+Rect = tuple[int, int, int, int]
+
+
+class Canvas:
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        # Indexé en [x, y] comme pygame.surfarray
+        self.pixels = np.full((width, height), 255, dtype=np.uint8)
+        self.ink_pixels = 0
+        # Boîte englobante de l'encre (x_min, y_min, x_max, y_max), bornes incluses
+        self.bbox: tuple[int, int, int, int] | None = None
+
+    @classmethod
+    def from_strokes(cls, strokes: list[list[list[float]]], size: int = 640, brush_size: int = 3) -> "Canvas":
+        # Traits au format QuickDraw [[x0, x1, ...], [y0, y1, ...]], mis à l'échelle du canevas
+        canvas = cls(size, size)
+        extent = max([255.0] + [max(max(stroke[0]), max(stroke[1])) for stroke in strokes if len(stroke[0])])
+        scale = (size - 1) / extent
+
+        for stroke in strokes:
+            points = [(int(round(x * scale)), int(round(y * scale))) for x, y in zip(stroke[0], stroke[1])]
+            for start, end in zip(points[:1] + points[:-1], points):
+                canvas.stamp_segment(start, end, brush_size)
+
+        return canvas
+
+    @property
+    def is_empty(self) -> bool:
+        return self.ink_pixels == 0
+
+    def clear(self) -> None:
+        self.pixels.fill(255)
+        self.ink_pixels = 0
+        self.bbox = None
+
+    def stamp_segment(self, start: tuple[int, int], end: tuple[int, int], brush_size: int) -> Rect | None:
+        if brush_size <= 0:
+            return None
+
+        (x_start, y_start), (x_end, y_end) = start, end
+        n_points = max(abs(x_end - x_start), abs(y_end - y_start)) + 1
+        xs = np.rint(np.linspace(x_start, x_end, n_points)).astype(np.int64)
+        ys = np.rint(np.linspace(y_start, y_end, n_points)).astype(np.int64)
+
+        x_low, x_high = max(int(xs.min()) - brush_size, 0), min(int(xs.max()) + brush_size, self.width)
+        y_low, y_high = max(int(ys.min()) - brush_size, 0), min(int(ys.max()) + brush_size, self.height)
+        if x_low >= x_high or y_low >= y_high:
+            return None
+
+        w, h = x_high - x_low, y_high - y_low
+        left = np.clip(xs - brush_size - x_low, 0, w)
+        right = np.clip(xs + brush_size - x_low, 0, w)
+        top = np.clip(ys - brush_size - y_low, 0, h)
+        bottom = np.clip(ys + brush_size - y_low, 0, h)
+
+        # Union des carrés du pinceau : tableau de différences puis somme cumulée 2D,
+        # en O(points + surface du rectangle) quelle que soit la taille du pinceau
+        coverage = np.zeros((w + 1, h + 1), dtype=np.int32)
+        np.add.at(coverage, (left, top), 1)
+        np.add.at(coverage, (right, top), -1)
+        np.add.at(coverage, (left, bottom), -1)
+        np.add.at(coverage, (right, bottom), 1)
+        mask = coverage.cumsum(axis=0).cumsum(axis=1)[:w, :h] > 0
+
+        region = self.pixels[x_low:x_high, y_low:y_high]
+        self.ink_pixels += int(np.count_nonzero(region[mask]))
+        region[mask] = 0
+
+        stamped = (right > left) & (bottom > top)
+        if stamped.any():
+            stamp_bbox = (
+                x_low + int(left[stamped].min()),
+                y_low + int(top[stamped].min()),
+                x_low + int(right[stamped].max()) - 1,
+                y_low + int(bottom[stamped].max()) - 1,
+            )
+            self._extend_bbox(stamp_bbox)
+
+        return x_low, y_low, w, h
+
+    def _extend_bbox(self, bbox: tuple[int, int, int, int]) -> None:
+        if self.bbox is None:
+            self.bbox = bbox
+            return
+
+        self.bbox = (
+            min(self.bbox[0], bbox[0]),
+            min(self.bbox[1], bbox[1]),
+            max(self.bbox[2], bbox[2]),
+            max(self.bbox[3], bbox[3]),
+        )
+
+
+def ink_bbox(pixels: np.ndarray) -> tuple[int, int, int, int] | None:
+    ink_columns = np.flatnonzero((pixels != 255).any(axis=1))
+    if len(ink_columns) == 0:
+        return None
+
+    ink_rows = np.flatnonzero((pixels != 255).any(axis=0))
+    return int(ink_columns[0]), int(ink_rows[0]), int(ink_columns[-1]), int(ink_rows[-1])
@@ -0,0 +1,54 @@
+import datetime
+import json
+from argparse import ArgumentParser
+from functools import lru_cache
+from pathlib import Path
+
+CATALOG_PATH = Path(__file__).parent / "quickdraw_classes.json"
+
+
+@lru_cache
+def load_class_names(catalog_path: Path = CATALOG_PATH) -> frozenset[str]:
+    if not catalog_path.exists():
+        raise FileNotFoundError(
+            f"The QuickDraw class catalog {catalog_path} is missing. Run `python catalog.py --refresh` to rebuild it."
+        )
+
+    with open(catalog_path, "r") as catalog_file:
+        catalog = json.load(catalog_file)
+
+    return frozenset(catalog["classes"])
+
+
+def refresh_catalog(catalog_path: Path = CATALOG_PATH) -> dict:
+    from importlib.metadata import version
+
+    from quickdraw import QuickDrawData
+
+    catalog = {
+        "source": "quickdraw",
+        "version": version("quickdraw"),
+        "generated_at": datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "classes": sorted(QuickDrawData(print_messages=False).drawing_names),
+    }
+
+    with open(catalog_path, "w") as catalog_file:
+        json.dump(catalog, catalog_file, indent=2)
+        catalog_file.write("\n")
+
+    load_class_names.cache_clear()
+    return catalog
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--refresh", action="store_true", help="Rebuild the catalog from the installed quickdraw package")
+    parser.add_argument("--catalog-path", default=CATALOG_PATH, type=Path)
+
+    args = parser.parse_args()
+
+    if args.refresh:
+        catalog = refresh_catalog(args.catalog_path)
+        print(f"Wrote {len(catalog['classes'])} classes from quickdraw {catalog['version']} to {args.catalog_path}")
+    else:
+        print(f"{len(load_class_names(args.catalog_path))} classes in {args.catalog_path}")
@@ -0,0 +1,206 @@
+import json
+import random
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+import tensorflow as tf
+from keras.callbacks import Callback, EarlyStopping, ModelCheckpoint
+from keras.models import Model
+
+from schemas import Config
+
+if TYPE_CHECKING:
+    from data import Dataset
+
+RUN_FILE = "run.json"
+# Attributs des autres callbacks sauvegardés : l'arrêt anticipé et le meilleur modèle reprennent où ils en étaient
+CALLBACK_STATE = {EarlyStopping: ("wait", "best", "best_epoch"), ModelCheckpoint: ("best",)}
+
+
+def run_folder(config: Config) -> Path:
+    return config.checkpointing.folder / config.run_name
+
+
+def latest_run(config: Config) -> str:
+    runs = [path for path in config.checkpointing.folder.glob("*") if (path / "checkpoint").exists()]
+    if not runs:
+        raise FileNotFoundError(f"No checkpointed run in {config.checkpointing.folder}.")
+
+    return max(runs, key=lambda path: (path / "checkpoint").stat().st_mtime).name
+
+
+def _read_run_file(folder: Path) -> dict[str, Any]:
+    if not (folder / RUN_FILE).exists():
+        return {}
+
+    with open(folder / RUN_FILE, "r") as run_file:
+        return json.load(run_file)
+
+
+def read_run_info(config: Config) -> dict[str, Any]:
+    # Nom du run et identifiant wandb, pour reprendre le même run
+    return _read_run_file(run_folder(config))
+
+
+def _to_json(value: Any) -> Any:
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _global_rng_state() -> dict[str, Any]:
+    version, internal_state, gauss = random.getstate()
+    name, keys, *numpy_state = np.random.get_state()
+    return {"python": [version, list(internal_state), gauss], "numpy": [name, keys.tolist(), *numpy_state]}
+
+
+def _set_global_rng_state(state: dict[str, Any]) -> None:
+    version, internal_state, gauss = state["python"]
+    random.setstate((version, tuple(internal_state), gauss))
+    name, keys, *numpy_state = state["numpy"]
+    np.random.set_state((name, np.array(keys, dtype=np.uint32), *numpy_state))
+
+
+class TrainingCheckpoint(Callback):
+    def __init__(self, config: Config, callbacks: list[Callback]):
+        super().__init__()
+        self.folder = run_folder(config)
+        self.run_name = config.run_name
+        self.save_steps = config.checkpointing.save_steps
+        self.max_to_keep = config.checkpointing.max_to_keep
+        # Écriture asynchrone : les variables sont copiées puis écrites sans bloquer le pas d'entraînement
+        self.options = tf.train.CheckpointOptions(enable_async=config.checkpointing.async_write)
+        self.use_wandb = config.wandb_parameters is not None
+        self.tracked = [callback for callback in callbacks if type(callback) in CALLBACK_STATE]
+
+        # Prochaine époque et prochain lot à entraîner
+        self.epoch = tf.Variable(0, dtype=tf.int64, trainable=False)
+        self.step = tf.Variable(0, dtype=tf.int64, trainable=False)
+        # État hors TensorFlow (générateurs aléatoires, callbacks) sérialisé en JSON
+        self.host_state = tf.Variable("", dtype=tf.string, trainable=False)
+        self.order: tf.Variable | None = None
+
+        self.checkpoint: tf.train.Checkpoint | None = None
+        self.manager: tf.train.CheckpointManager | None = None
+        # Chargeur d'entraînement, dont l'ordre des échantillons est sauvegardé
+        self.dataset: "Dataset | None" = None
+        self.callback_states: list[dict[str, Any]] | None = None
+        self.initial_step = 0
+        self.step_offset = 0
+        self.current_epoch = 0
+        self.saved_iterations = 0
+
+    def _build(self, model: Model, dataset: "Dataset") -> None:
+        from data import get_shuffle_state
+
+        shuffle_state = get_shuffle_state(dataset)
+        n_samples = 0 if shuffle_state is None else len(shuffle_state[0])
+        self.dataset = dataset
+        self.order = tf.Variable(np.zeros(n_samples, dtype=np.int64), trainable=False)
+        self.checkpoint = tf.train.Checkpoint(
+            model=model,
+            optimizer=model.optimizer,
+            epoch=self.epoch,
+            step=self.step,
+            order=self.order,
+            host_state=self.host_state,
+            # Générateur global de TensorFlow, sa graine et son compteur sont des variables
+            rng=tf.random.get_global_generator(),
+        )
+        self.manager = tf.train.CheckpointManager(self.checkpoint, self.folder, max_to_keep=self.max_to_keep)
+
+    def restore(self, model: Model, dataset: "Dataset") -> tuple[int, int]:
+        from data import set_shuffle_state
+
+        self._build(model, dataset)
+        if self.manager.latest_checkpoint is None:
+            raise FileNotFoundError(f"No checkpoint to resume from in {self.folder}.")
+
+        # Les variables de l'optimiseur, créées au premier pas, sont restaurées à leur création
+        self.checkpoint.restore(self.manager.latest_checkpoint).assert_existing_objects_matched()
+        restored_state = json.loads(self.host_state.numpy().decode())
+        self.callback_states = restored_state["callbacks"]
+        epoch, step = int(self.epoch.numpy()), int(self.step.numpy())
+        if restored_state["shuffle_rng"] is not None:
+            set_shuffle_state(dataset, self.order.numpy(), restored_state["shuffle_rng"])
+            # Sauvegardé en fin d'époque, l'ordre noté est celui de l'époque finie : le mélange suivant est rejoué
+            if epoch > restored_state["shuffle_epoch"]:
+                dataset.on_epoch_end()
+        else:
+            # Le mélange de tf.data reste dans l'itérateur créé par model.fit, hors du checkpoint
+            print("The tf_data loader's shuffle order is not checkpointed: the resumed epoch draws a new one.")
+        _set_global_rng_state(restored_state["global_rng"])
+
+        self.initial_step = step
+        self.saved_iterations = int(model.optimizer.iterations.numpy())
+        print(f"Resuming {self.run_name} at epoch {epoch + 1}, step {step} from {self.folder}")
+        return epoch, step
+
+    def on_train_begin(self, logs: dict[str, Any] | None = None) -> None:
+        if self.checkpoint is None:
+            self._build(self.model, self.dataset)
+
+        # EarlyStopping repart de zéro à chaque model.fit : on réapplique l'état restauré ou celui du fit précédent
+        if self.callback_states is not None:
+            for callback, state in zip(self.tracked, self.callback_states):
+                for attribute, value in state.items():
+                    setattr(callback, attribute, value)
+
+        self.folder.mkdir(parents=True, exist_ok=True)
+        run_info = {**_read_run_file(self.folder), "run_name": self.run_name}
+        if self.use_wandb:
+            import wandb
+
+            if wandb.run is not None:
+                run_info["wandb_run_id"] = wandb.run.id
+        with open(self.folder / RUN_FILE, "w") as run_file:
+            json.dump(run_info, run_file, indent=2)
+
+    def on_epoch_begin(self, epoch: int, logs: dict[str, Any] | None = None) -> None:
+        # L'époque reprise est entraînée à partir du lot sauvegardé : ses numéros de lot sont décalés d'autant
+        self.current_epoch = epoch
+        self.step_offset, self.initial_step = self.initial_step, 0
+
+    def on_train_batch_end(self, batch: int, logs: dict[str, Any] | None = None) -> None:
+        if self.save_steps is None or batch + 1 >= self.params["steps"]:
+            return
+
+        # Avec steps_per_execution, le compteur avance de plusieurs pas à la fois
+        iterations = int(self.model.optimizer.iterations.numpy())
+        if iterations // self.save_steps > self.saved_iterations // self.save_steps:
+            self._save(self.current_epoch, self.step_offset + batch + 1)
+
+    def on_epoch_end(self, epoch: int, logs: dict[str, Any] | None = None) -> None:
+        self._save(epoch + 1, 0)
+
+    def on_train_end(self, logs: dict[str, Any] | None = None) -> None:
+        # Attendre la fin de la dernière écriture asynchrone
+        self.checkpoint.sync()
+        self.callback_states = self._callback_states()
+
+    def _callback_states(self) -> list[dict[str, Any]]:
+        return [
+            {name: _to_json(getattr(callback, name, None)) for name in CALLBACK_STATE[type(callback)]}
+            for callback in self.tracked
+        ]
+
+    def _save(self, epoch: int, step: int) -> None:
+        from data import get_shuffle_state
+
+        # model.fit ne mélange le chargeur qu'après les callbacks de fin d'époque : l'ordre lu est celui de l'époque
+        # en cours, et le générateur n'a pas encore tiré le suivant
+        order, shuffle_rng = get_shuffle_state(self.dataset) or (None, None)
+        state = {
+            "shuffle_epoch": self.current_epoch,
+            "shuffle_rng": shuffle_rng,
+            "global_rng": _global_rng_state(),
+            "callbacks": self._callback_states(),
+        }
+
+        self.epoch.assign(epoch)
+        self.step.assign(step)
+        if order is not None:
+            self.order.assign(order)
+        self.host_state.assign(json.dumps(state))
+
+        self.saved_iterations = int(self.model.optimizer.iterations.numpy())
+        self.manager.save(checkpoint_number=self.saved_iterations, options=self.options)
@@ -1,54 +1,73 @@
 import datetime
 from pathlib import Path
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
-import yaml
 from keras.callbacks import EarlyStopping, ModelCheckpoint
 
-from schemas import Config
-import numpy as np
-import matplotlib.pyplot as plt
-from sklearn.metrics import confusion_matrix, ConfusionMatrixDisplay
+from schemas import Config, get_config  # noqa: F401
 
+from keras import mixed_precision
 from keras.models import Model
-from keras.preprocessing.image import DirectoryIterator
 
-from resnet import ResNet34
+from models import build_model
 from keras.optimizers import Adam  # noqa: E402
 
+if TYPE_CHECKING:
+    from evaluation import StreamingMetrics
+
 
 def generate_run_name(config: Config) -> None:
+    if config.run_name is not None:
+        return
+
     datetime_str = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     run_name = f"{config.loss_name}_lr:{config.learning_rate}_bs:{config.data.batch_size}_{datetime_str}"
     config.run_name = run_name
 
 
 def generate_model(config: Config, weights_path: Path | None = None) -> Model:
-    model = ResNet34(config.image_size + (1,), len(config.data.classes))
+    # La politique s'applique aux couches créées ensuite, les variables restent en float32
+    mixed_precision.set_global_policy(config.training.precision)
+    model = build_model(config, weights_path)
 
     optimizer = Adam(learning_rate=config.learning_rate)
 
-    if weights_path is not None:
-        model.load_weights(weights_path)
-
-    model.compile(optimizer=optimizer, loss=config.loss, metrics=["accuracy"])
+    # Avec des sorties anticipées, la même perte est appliquée à chaque tête puis pondérée
+    loss_weights = None
+    if config.early_exits is not None:
+        loss_weights = config.early_exits.loss_weights or [1.0] * len(config.architecture.stage_depths)
+
+    model.compile(
+        optimizer=optimizer,
+        loss=config.build_loss(),
+        loss_weights=loss_weights,
+        metrics=["accuracy"],
+        jit_compile=config.training.jit_compile,
+        steps_per_execution=config.training.steps_per_execution,
+    )
 
     return model
 
 
-def get_callbacks(config: Config) -> list[Any]:
+def get_callbacks(config: Config, wandb_run_id: str | None = None) -> list[Any]:
+    from distributed import is_chief
+
     callbacks = []
-    if config.wandb_parameters is not None:
+    # En multi-worker, seul le chef journalise dans wandb
+    if config.wandb_parameters is not None and is_chief():
         try:
             import wandb
             from wandb.keras import WandbCallback
 
             wandb.ensure_configured()
             if wandb.run is None:
+                # Un entraînement repris continue le même run wandb
                 wandb.init(
                     project=config.wandb_parameters.project_name,
                     entity=config.wandb_parameters.username,
                     name=config.run_name,
+                    id=wandb_run_id,
+                    resume="must" if wandb_run_id is not None else None,
                 )
                 wandb_config = {
                     "learning_rate": config.learning_rate,
@@ -77,44 +96,59 @@ def get_callbacks(config: Config) -> list[Any]:
                 " Please install it or run without these configuration options."
             ) from e
 
+    # En multi-worker, ModelCheckpoint n'écrit le fichier final que sur le chef,
+    # les autres workers sauvegardent dans un dossier temporaire supprimé aussitôt
     best_model_path = f"./models/best_model-{config.run_name}.keras"
     callbacks.append(
         ModelCheckpoint(best_model_path, monitor="val_loss", save_best_only=True, mode="min", save_weights_only=True)
     )
     callbacks.append(EarlyStopping(monitor="val_loss", patience=3))
 
-    return callbacks
+    if config.profiling is not None:
+        from profiling import ThroughputProfiler
 
+        callbacks.append(ThroughputProfiler(config))
 
-def get_config(config_path: Path) -> Config:
-    with open(config_path, "r") as config_file:
-        config_data = yaml.safe_load(config_file)
+    if config.checkpointing is not None:
+        from checkpoints import TrainingCheckpoint
 
-    config = Config(**config_data)
+        callbacks.append(TrainingCheckpoint(config, callbacks))
 
-    return config
+    return callbacks
 
 
-def wandb_confusion_matrix(model: Model, test_generator: DirectoryIterator) -> None:
+def wandb_log_evaluation(metrics: "StreamingMetrics") -> None:
+    import matplotlib.pyplot as plt
     import wandb
-
-    y_pred = model.predict(test_generator, steps=test_generator.samples // test_generator.batch_size + 1, verbose=0)
-    y_pred_classes = np.argmax(y_pred, axis=1)
-
-    y_true = test_generator.classes
-
-    if len(y_pred_classes) != len(y_true):
-        raise ValueError("Le nombre de prédictions ne correspond pas au nombre de vrais labels.")
-
-    class_names = list(test_generator.class_indices.keys())
+    from sklearn.metrics import ConfusionMatrixDisplay
+
+    wandb.log(
+        {
+            "test_loss": metrics.loss,
+            "test_accuracy": metrics.accuracy,
+            **{f"test_top_{k}_accuracy": accuracy for k, accuracy in metrics.top_k_accuracy.items()},
+            **{f"test_class_accuracy/{name}": accuracy for name, accuracy in metrics.per_class_accuracy.items()},
+        },
+        commit=False,
+    )
+    if metrics.exits is not None:
+        wandb.log(
+            {
+                "test_early_exit_accuracy": metrics.exits.accuracy,
+                "test_early_exit_mean_stages": metrics.exits.mean_stages,
+                **{f"test_exit_usage/{name}": usage for name, usage in metrics.exits.usage.items()},
+                **{f"test_exit_accuracy/{name}": accuracy for name, accuracy in metrics.exits.exit_accuracy.items()},
+                **{f"test_head_accuracy/{name}": accuracy for name, accuracy in metrics.exits.head_accuracy.items()},
+            },
+            commit=False,
+        )
 
     plt.figure(figsize=(15, 15))
 
     font_size = 6
     plt.rcParams.update({"font.size": font_size})
 
-    conf_matrix = confusion_matrix(y_true, y_pred_classes)
-    conf_matrix_disp = ConfusionMatrixDisplay(confusion_matrix=conf_matrix, display_labels=class_names)
+    conf_matrix_disp = ConfusionMatrixDisplay(confusion_matrix=metrics.confusion, display_labels=metrics.class_names)
     conf_matrix_disp.plot(include_values=False)
 
     fig = plt.gcf()
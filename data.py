@@ -1,80 +1,584 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Iterator, Literal
+
 import numpy as np
+import tensorflow as tf
 from PIL import Image
-from quickdraw import QuickDrawDataGroup
-from keras.preprocessing.image import ImageDataGenerator
+from keras.preprocessing.image import DirectoryIterator, ImageDataGenerator
+from keras.utils import Sequence
 from tqdm import tqdm
 import shutil
 
-from schemas import Config
+from raster import PIL_STROKE_WIDTH, PIL_THRESHOLD, Strokes, rasterize_strokes, render_strokes_pil
+from rawdata import RawDataStore
+from schemas import Config, RawData
+from strokes import encode_drawings
+
+SUBSETS = ["train", "validation", "test"]
+MANIFEST_FILE = "manifest.json"
+PACKED_INDEX_FILE = "index.json"
+
+
+def _shard_paths(base_directory: Path, subset: str, name: str, data_format: str = "packed") -> tuple[Path, Path]:
+    samples = "points" if data_format == "strokes" else "images"
+    return base_directory / subset / f"{name}.{samples}.npy", base_directory / subset / f"{name}.labels.npy"
+
+
+def _subset(i: int, num_train: int, num_val: int) -> str:
+    if i < num_train:
+        return "train"
+    elif i < num_train + num_val:
+        return "validation"
+    return "test"
+
+
+def render_drawings(
+    drawings: list[Strokes], image_size: tuple[int, int], renderer: Literal["pil", "numpy"], stroke_width: int
+) -> np.ndarray:
+    if renderer == "numpy":
+        return rasterize_strokes(drawings, image_size, stroke_width=stroke_width)
+
+    return render_strokes_pil(drawings, image_size)
+
+
+def save_class_images(
+    base_directory: Path,
+    name: str,
+    images: np.ndarray,
+    key_ids: list[str],
+    num_train: int,
+    num_val: int,
+    data_format: Literal["png", "packed", "strokes"] = "png",
+    label: int = 0,
+    offset: int = 0,
+) -> None:
+    # offset : index du premier dessin de images, les précédents sont déjà en place (png uniquement)
+    for subset in SUBSETS:
+        if data_format == "png":
+            class_directory = base_directory / subset / name
+            # Repartir de dossiers vides, une génération interrompue a pu laisser des images
+            if offset == 0 and class_directory.exists():
+                shutil.rmtree(class_directory)
+            class_directory.mkdir(parents=True, exist_ok=True)
+        else:
+            (base_directory / subset).mkdir(parents=True, exist_ok=True)
+
+    packed_images: dict[str, list[np.ndarray]] = {subset: [] for subset in SUBSETS}
+
+    for i, (key_id, img) in enumerate(zip(key_ids, images), start=offset):
+        subset = _subset(i, num_train, num_val)
+
+        if data_format == "png":
+            Image.fromarray(img).save(base_directory / subset / name / f"{key_id}.png")
+        else:
+            packed_images[subset].append(img)
+
+    if data_format != "png":
+        for subset, subset_images in packed_images.items():
+            images_path, labels_path = _shard_paths(base_directory, subset, name, data_format)
+            empty = np.zeros((0,) + images.shape[1:], dtype=images.dtype)
+            array = np.stack(subset_images) if subset_images else empty
+            if data_format == "strokes":
+                # Séquences de points en float16 : 384 octets par dessin à 64 points
+                np.save(images_path, array.astype(np.float16))
+            else:
+                # Un bit par pixel : 98 octets par dessin en 28x28
+                np.save(images_path, np.packbits(array.reshape(len(array), -1), axis=1))
+            np.save(labels_path, np.full(len(array), label, dtype=np.int32))
+
+
+def _remove_class_files(base_directory: Path, name: str, data_format: str) -> None:
+    for subset in SUBSETS:
+        if data_format == "png":
+            shutil.rmtree(base_directory / subset / name, ignore_errors=True)
+        else:
+            for path in _shard_paths(base_directory, subset, name, data_format):
+                path.unlink(missing_ok=True)
+
+
+def _relabel_class(base_directory: Path, name: str, data_format: str, label: int) -> None:
+    # L'ajout d'une classe décale les indices des suivantes : seules les étiquettes sont réécrites
+    if data_format == "png":
+        return
+
+    for subset in SUBSETS:
+        labels_path = _shard_paths(base_directory, subset, name, data_format)[1]
+        np.save(labels_path, np.full(len(np.load(labels_path, mmap_mode="r")), label, dtype=np.int32))
+
+
+def _load_class_samples(
+    base_directory: Path, name: str, data_format: str, sample_shape: tuple[int, int], count: int
+) -> np.ndarray:
+    # Échantillons déjà générés dans l'ordre des dessins : train, puis validation, puis test
+    shards = [np.load(_shard_paths(base_directory, subset, name, data_format)[0]) for subset in SUBSETS]
+    samples = np.concatenate(shards)[:count]
+    if data_format == "strokes":
+        return samples
+
+    n_pixels = sample_shape[0] * sample_shape[1]
+    return np.unpackbits(samples, axis=1, count=n_pixels).reshape((len(samples),) + sample_shape)
+
 
+def _move_png_images(base_directory: Path, name: str, key_ids: list[str], num_train: int, num_val: int) -> None:
+    # Les images conservées changent de sous-ensemble si les effectifs changent, les autres sont supprimées
+    expected = {key_id: _subset(i, num_train, num_val) for i, key_id in enumerate(key_ids)}
+    for subset in SUBSETS:
+        class_directory = base_directory / subset / name
+        if not class_directory.exists():
+            continue
 
-def generate_class_images(config, name, num_train, num_val, num_test):
-    base_directory = config.data.folder
-    image_size = config.image_size
+        for path in class_directory.glob("*.png"):
+            target = expected.get(path.stem)
+            if target is None:
+                path.unlink()
+            elif target != subset:
+                (base_directory / target / name).mkdir(parents=True, exist_ok=True)
+                os.replace(path, base_directory / target / name / path.name)
 
+
+def generate_class_images(
+    base_directory: Path,
+    image_size: tuple[int, int],
+    name: str,
+    num_train: int,
+    num_val: int,
+    num_test: int,
+    data_format: Literal["png", "packed", "strokes"] = "png",
+    label: int = 0,
+    renderer: Literal["pil", "numpy"] = "pil",
+    stroke_width: int = 1,
+    sequence_length: int = 64,
+    simplify_epsilon: float = 2.0,
+    raw_data: RawData | None = None,
+    previous: dict | None = None,
+) -> tuple[str, dict]:
     # Calculer le nombre total de dessins
     total_drawings = num_train + num_val + num_test
 
-    # Créer les dossiers s'ils n'existent pas
-    for subset in ["train", "validation", "test"]:
-        (base_directory / subset / name).mkdir(parents=True, exist_ok=True)
+    # Les fichiers bruts sont lus depuis le cache local, téléchargés une seule fois
+    store = RawDataStore.from_config(raw_data or RawData())
+    drawings = store.load_drawings(name, total_drawings, recognized=True)
+    key_ids = [str(drawing.key_id) for drawing in drawings]
 
-    images = QuickDrawDataGroup(name, max_drawings=total_drawings, recognized=True, print_messages=False)
+    # Les dessins sont toujours lus dans le même ordre : ceux déjà rendus avec les mêmes réglages sont réutilisés
+    reused = min(previous["drawings"], len(drawings)) if previous is not None else 0
 
-    for i, img in enumerate(images.drawings):
-        if i < num_train:
-            subset = "train"
-        elif i < num_train + num_val:
-            subset = "validation"
-        else:
-            subset = "test"
+    def render(batch: list[Strokes]) -> np.ndarray:
+        if data_format == "strokes":
+            return encode_drawings(batch, sequence_length, simplify_epsilon)
+        return render_drawings(batch, image_size, renderer, stroke_width)
+
+    missing = [drawing.strokes for drawing in drawings[reused:]]
+    if data_format == "png":
+        if reused:
+            _move_png_images(base_directory, name, key_ids[:reused], num_train, num_val)
+        if missing or not reused:
+            rendered = render(missing)
+            save_class_images(
+                base_directory, name, rendered, key_ids[reused:], num_train, num_val, data_format, label, reused
+            )
+    else:
+        sample_shape = (sequence_length, 3) if data_format == "strokes" else (image_size[1], image_size[0])
+        parts = [_load_class_samples(base_directory, name, data_format, sample_shape, reused)] if reused else []
+        if missing:
+            parts.append(render(missing))
+        rendered = np.concatenate(parts) if parts else np.zeros((0,) + sample_shape, dtype=np.uint8)
+        save_class_images(base_directory, name, rendered, key_ids, num_train, num_val, data_format, label)
+
+    entry = {
+        "source": store.ref(name)["sha256"],
+        "label": label,
+        "splits": {"train": num_train, "validation": num_val, "test": num_test},
+        "drawings": len(drawings),
+    }
+    return name, entry
+
+
+def _render_settings(config: Config) -> dict:
+    # Réglages dont dépend chaque échantillon : s'ils changent, toutes les classes sont régénérées
+    if config.data.format == "strokes":
+        return {
+            "format": config.data.format,
+            "sequence_length": config.strokes.length,
+            "simplify_epsilon": config.strokes.simplify_epsilon,
+        }
+
+    numpy_renderer = config.data.renderer == "numpy"
+    return {
+        "format": config.data.format,
+        "image_size": list(config.image_size),
+        "renderer": config.data.renderer,
+        "stroke_width": config.data.stroke_width if numpy_renderer else PIL_STROKE_WIDTH,
+        "threshold": None if numpy_renderer else PIL_THRESHOLD,
+    }
 
-        filename = base_directory / subset / name / f"{img.key_id}.png"
-        img = img.get_image(stroke_width=3).resize(image_size).convert("L")
 
-        img = np.array(img) / 255.0
-        threshold = 0.9
-        img = np.where(img <= threshold, 0, 1)
+def read_manifest(base_directory: Path) -> dict | None:
+    manifest_path = base_directory / MANIFEST_FILE
+    if not manifest_path.exists():
+        return None
 
-        Image.fromarray(img.astype(np.uint8)).save(filename)
+    with open(manifest_path, "r") as manifest_file:
+        return json.load(manifest_file)
+
+
+def dataset_version(base_directory: Path) -> str | None:
+    # Empreinte du manifeste : elle change dès qu'une classe est ajoutée, retirée ou régénérée
+    manifest = read_manifest(base_directory)
+    if manifest is None:
+        return None
+
+    return hashlib.sha256(json.dumps(manifest, sort_keys=True).encode()).hexdigest()[:8]
+
+
+def _write_manifest(base_directory: Path, manifest: dict) -> None:
+    base_directory.mkdir(parents=True, exist_ok=True)
+    manifest_part = base_directory / f"{MANIFEST_FILE}.part"
+    with open(manifest_part, "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    os.replace(manifest_part, base_directory / MANIFEST_FILE)
 
 
 def generate_data(config: Config) -> None:
     if not config.data.generate:
         return
 
-    if (
-        config.data.generate
-        and config.data.folder.exists()
-        and any(elem.is_dir() for elem in config.data.folder.iterdir())
-    ):
-        msg = (
-            f"The folder at {config.data.folder} already exists and is not empty."
-            "Do you still want to regenerate the data? [Y/n] "
-        )
-        res = input(msg)
-        while res not in {"Y", "y", "N", "n"}:
-            res = input(msg)
+    folder = config.data.folder
+    class_names = sorted(config.data.classes)
+    settings = _render_settings(config)
+    splits = {
+        "train": config.data.train_samples,
+        "validation": config.data.validation_samples,
+        "test": config.data.test_samples,
+    }
+
+    manifest = read_manifest(folder)
+    if manifest is None:
+        if folder.exists() and any(elem.is_dir() for elem in folder.iterdir()):
+            print(f"No {MANIFEST_FILE} in {folder}, every class will be regenerated.")
+        manifest = {"settings": settings, "classes": {}}
+    elif manifest["settings"] != settings:
+        print(f"The rendering settings of {folder} changed, every class will be regenerated.")
+        for name in manifest["classes"]:
+            _remove_class_files(folder, name, manifest["settings"]["format"])
+        (folder / PACKED_INDEX_FILE).unlink(missing_ok=True)
+        manifest = {"settings": settings, "classes": {}}
 
-        if res in {"N", "n"}:
-            return
+    entries: dict[str, dict] = manifest["classes"]
+    for name in [name for name in entries if name not in class_names]:
+        _remove_class_files(folder, name, config.data.format)
+        del entries[name]
+
+    # Comparaison de la configuration avec le manifeste, classe par classe
+    store = RawDataStore.from_config(config.raw_data)
+    pending: dict[str, dict | None] = {}
+    for label, name in enumerate(class_names):
+        entry = entries.pop(name, None)
+        ref = store.ref(name)
+        # Sans fichier brut en cache, la version générée est conservée plutôt que de la télécharger pour comparer
+        if entry is not None and ref is not None and entry["source"] != ref["sha256"]:
+            _remove_class_files(folder, name, config.data.format)
+            entry = None
+
+        if entry is not None and entry["splits"] == splits:
+            if entry["label"] != label:
+                _relabel_class(folder, name, config.data.format, label)
+                entry["label"] = label
+            entries[name] = entry
         else:
-            shutil.rmtree(config.data.folder)
+            pending[name] = entry
+
+    # Le manifeste ne liste que les classes complètes, une génération interrompue reprend où elle s'est arrêtée
+    _write_manifest(folder, manifest)
+
+    if pending:
+        print(f"Generating {len(pending)}/{len(class_names)} classes in {folder}.")
+    else:
+        print(f"The dataset in {folder} is up to date.")
+
+    jobs = [
+        (
+            folder,
+            config.image_size,
+            name,
+            config.data.train_samples,
+            config.data.validation_samples,
+            config.data.test_samples,
+            config.data.format,
+            class_names.index(name),
+            config.data.renderer,
+            config.data.stroke_width,
+            config.strokes.length,
+            config.strokes.simplify_epsilon,
+            config.raw_data,
+            previous,
+        )
+        for name, previous in pending.items()
+    ]
+
+    if config.data.workers == 1:
+        for job in tqdm(jobs):
+            name, entry = generate_class_images(*job)
+            entries[name] = entry
+            _write_manifest(folder, manifest)
+    else:
+        with ProcessPoolExecutor(max_workers=config.data.workers) as executor:
+            futures = [executor.submit(generate_class_images, *job) for job in jobs]
+            for future in tqdm(as_completed(futures), total=len(futures)):
+                name, entry = future.result()
+                entries[name] = entry
+                _write_manifest(folder, manifest)
+
+    if config.data.format != "png":
+        write_packed_index(folder, class_names, config.input_shape[:2], config.data.format)
+
+
+def write_packed_index(
+    base_directory: Path, class_names: list[str], sample_shape: tuple[int, int], data_format: str = "packed"
+) -> None:
+    # sample_shape : (hauteur, largeur) des images, ou (points, caractéristiques) des séquences
+    index: dict = {"format": data_format, "sample_shape": list(sample_shape), "classes": class_names, "splits": {}}
+
+    for subset in SUBSETS:
+        shards = []
+        for name in class_names:
+            images_path, labels_path = _shard_paths(base_directory, subset, name, data_format)
+            images = np.load(images_path, mmap_mode="r")
+            shards.append(
+                {
+                    "images": str(images_path.relative_to(base_directory)),
+                    "labels": str(labels_path.relative_to(base_directory)),
+                    "samples": int(images.shape[0]),
+                }
+            )
+        index["splits"][subset] = shards
+
+    with open(base_directory / PACKED_INDEX_FILE, "w") as index_file:
+        json.dump(index, index_file, indent=2)
+
+
+class PackedSequence(Sequence):
+    def __init__(self, base_directory: Path, subset: str, batch_size: int, shuffle: bool, seed: int | None = None):
+        super().__init__()
 
-    for label in tqdm(config.data.classes):
-        generate_class_images(
-            config, label, config.data.train_samples, config.data.validation_samples, config.data.test_samples
+        with open(base_directory / PACKED_INDEX_FILE, "r") as index_file:
+            index = json.load(index_file)
+
+        shards = index["splits"][subset]
+        self.format = index.get("format", "packed")
+        self.sample_shape = tuple(index.get("sample_shape", index.get("image_shape")))
+        self.class_indices = {name: i for i, name in enumerate(index["classes"])}
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+
+        self._images = [np.load(base_directory / shard["images"], mmap_mode="r") for shard in shards]
+        labels = [np.load(base_directory / shard["labels"]) for shard in shards]
+
+        self._shard_ids = np.concatenate([np.full(len(shard), i, dtype=np.int32) for i, shard in enumerate(labels)])
+        self._offsets = np.concatenate([np.arange(len(shard), dtype=np.int64) for shard in labels])
+        self.classes = np.concatenate(labels)
+        self.samples = len(self.classes)
+
+        self._rng = np.random.default_rng(seed)
+        self._order = np.arange(self.samples)
+        self.on_epoch_end()
+
+    def __len__(self) -> int:
+        return (self.samples + self.batch_size - 1) // self.batch_size
+
+    def __getitem__(self, idx: int) -> tuple[np.ndarray, np.ndarray]:
+        batch = self._order[idx * self.batch_size : (idx + 1) * self.batch_size]
+        shard_ids = self._shard_ids[batch]
+        offsets = self._offsets[batch]
+
+        packed = np.empty((len(batch),) + self._images[0].shape[1:], dtype=self._images[0].dtype)
+        for shard_id in np.unique(shard_ids):
+            mask = shard_ids == shard_id
+            packed[mask] = self._images[shard_id][offsets[mask]]
+
+        if self.format == "strokes":
+            return packed.astype(np.float32), self.classes[batch].astype(np.float32)
+
+        n_pixels = self.sample_shape[0] * self.sample_shape[1]
+        x = np.unpackbits(packed, axis=1, count=n_pixels).reshape((len(batch),) + self.sample_shape + (1,))
+
+        return x.astype(np.float32), self.classes[batch].astype(np.float32)
+
+    def on_epoch_end(self) -> None:
+        if self.shuffle:
+            self._order = self._rng.permutation(self.samples)
+
+    def read_packed(self) -> np.ndarray:
+        return np.concatenate([np.asarray(images) for images in self._images])
+
+
+class ShuffledDirectoryIterator(DirectoryIterator):
+    # DirectoryIterator mélange avec l'état global de numpy : comme PackedSequence, ce chargeur a son propre
+    # générateur, dont l'état peut être sauvegardé et restauré. Sans graine, il est tiré de l'état global,
+    # qui reste fixé par tf.keras.utils.set_random_seed
+    def __init__(self, *args: Any, seed: int | None = None, **kwargs: Any):
+        self._rng = np.random.default_rng(np.random.randint(2**31) if seed is None else seed)
+        super().__init__(*args, **kwargs)
+
+    def _set_index_array(self) -> None:
+        self.index_array = self._rng.permutation(self.n) if self.shuffle else np.arange(self.n)
+
+
+class SkippedSequence(Sequence):
+    # Fin d'une époque interrompue : les lots du chargeur à partir de start, dans l'ordre de l'époque en cours
+    def __init__(self, sequence: Sequence, start: int):
+        super().__init__()
+        self.sequence = sequence
+        self.start = start
+
+    def __len__(self) -> int:
+        return len(self.sequence) - self.start
+
+    def __getitem__(self, idx: int) -> tuple[np.ndarray, np.ndarray]:
+        return self.sequence[self.start + idx]
+
+    def on_epoch_end(self) -> None:
+        self.sequence.on_epoch_end()
+
+
+Dataset = DirectoryIterator | PackedSequence | tf.data.Dataset
+
+
+def _list_png_files(folder: Path, class_names: list[str]) -> tuple[list[str], list[int]]:
+    def list_class(name: str) -> list[str]:
+        with os.scandir(folder / name) as entries:
+            return sorted(entry.path for entry in entries if entry.name.endswith(".png"))
+
+    # Un dossier par classe, listés en parallèle mais rassemblés dans un ordre déterministe
+    with ThreadPoolExecutor() as executor:
+        files_per_class = list(executor.map(list_class, class_names))
+
+    paths = [path for files in files_per_class for path in files]
+    labels = [label for label, files in enumerate(files_per_class) for _ in files]
+    return paths, labels
+
+
+def _get_tf_dataset(
+    config: Config,
+    subset: str,
+    training: bool,
+    shard: tuple[int, int] | None = None,
+    batch_size: int | None = None,
+) -> tf.data.Dataset:
+    class_names = sorted(config.data.classes)
+    image_shape = (config.image_size[1], config.image_size[0])
+    batch_size = batch_size or config.data.batch_size
+
+    if config.data.format != "png":
+        sequence = PackedSequence(config.data.folder, subset, config.data.batch_size, shuffle=False)
+        rows = sequence.read_packed()
+        if config.data.format == "strokes":
+            rows = rows.astype(np.float32)
+        dataset = tf.data.Dataset.from_tensor_slices((rows, sequence.classes.astype(np.float32)))
+        if shard is not None:
+            dataset = dataset.shard(*shard)
+    else:
+        paths, labels = _list_png_files(config.data.folder / subset, class_names)
+
+        def decode(path: tf.Tensor, label: tf.Tensor) -> tuple[tf.Tensor, tf.Tensor]:
+            image = tf.io.decode_png(tf.io.read_file(path), channels=1)
+            image = tf.image.resize(image, image_shape, method="nearest")
+            return tf.cast(image, tf.float32), label
+
+        dataset = tf.data.Dataset.from_tensor_slices((paths, np.array(labels, dtype=np.float32)))
+        # Chaque worker ne lit et ne décode que sa part des fichiers
+        if shard is not None:
+            dataset = dataset.shard(*shard)
+        dataset = dataset.map(decode, num_parallel_calls=tf.data.AUTOTUNE, deterministic=not training)
+
+    if config.data.cache == "memory":
+        dataset = dataset.cache()
+    elif config.data.cache is not None:
+        # Une régénération incrémentale change la version : l'ancien cache n'est plus lu
+        version = dataset_version(config.data.folder)
+        cache_name = f"{config.data.format}_{subset}" + ("" if version is None else f"_{version}")
+        # Chaque worker ne lit que sa part des données : elle a son propre fichier de cache
+        if shard is not None:
+            cache_name += f"_shard{shard[1]}of{shard[0]}"
+        Path(config.data.cache).mkdir(parents=True, exist_ok=True)
+        dataset = dataset.cache(str(Path(config.data.cache) / cache_name))
+
+    if training:
+        dataset = dataset.shuffle(config.data.shuffle_buffer, reshuffle_each_iteration=True)
+
+    dataset = dataset.batch(batch_size)
+
+    if config.data.format == "packed":
+
+        def unpack(packed: tf.Tensor, label: tf.Tensor) -> tuple[tf.Tensor, tf.Tensor]:
+            shifts = tf.constant([7, 6, 5, 4, 3, 2, 1, 0], dtype=tf.uint8)
+            bits = tf.bitwise.bitwise_and(tf.bitwise.right_shift(packed[..., None], shifts), 1)
+            bits = tf.reshape(bits, (-1, bits.shape[1] * 8))[:, : image_shape[0] * image_shape[1]]
+            return tf.cast(tf.reshape(bits, (-1,) + image_shape + (1,)), tf.float32), label
+
+        dataset = dataset.map(unpack, num_parallel_calls=tf.data.AUTOTUNE, deterministic=not training)
+
+    options = tf.data.Options()
+    options.deterministic = not training
+    if shard is not None:
+        # Le découpage est déjà fait explicitement, tf.distribute ne doit pas le refaire
+        options.experimental_distribute.auto_shard_policy = tf.data.experimental.AutoShardPolicy.OFF
+    return dataset.with_options(options).prefetch(tf.data.AUTOTUNE)
+
+
+def _count_samples(config: Config, subset: str) -> int:
+    if config.data.format != "png":
+        return PackedSequence(config.data.folder, subset, config.data.batch_size, shuffle=False).samples
+
+    return len(_list_png_files(config.data.folder / subset, sorted(config.data.classes))[0])
+
+
+def get_distributed_datasets(
+    config: Config, num_workers: int, worker_index: int, global_batch_size: int
+) -> tuple[tf.data.Dataset, tf.data.Dataset, int, int]:
+    if global_batch_size % num_workers != 0:
+        raise ValueError(f"The global batch size {global_batch_size} is not divisible by {num_workers} workers.")
+
+    # Chaque worker lit sa part des données par lots globaux, que tf.distribute redécoupe par réplique.
+    # Les jeux sont répétés pour que tous les workers fassent le même nombre de pas.
+    worker_batch_size = global_batch_size // num_workers
+    shard = (num_workers, worker_index)
+    train = _get_tf_dataset(config, "train", True, shard, global_batch_size).repeat()
+    validation = _get_tf_dataset(config, "validation", False, shard, global_batch_size).repeat()
+
+    steps_per_epoch = max(1, _count_samples(config, "train") // num_workers // worker_batch_size)
+    validation_steps = max(1, _count_samples(config, "validation") // num_workers // worker_batch_size)
+    return train, validation, steps_per_epoch, validation_steps
+
+
+def get_train_val_datasets(config: Config) -> tuple[Dataset, Dataset, Dataset]:
+    if config.data.loader == "tf_data":
+        return (
+            _get_tf_dataset(config, "train", training=True),
+            _get_tf_dataset(config, "validation", training=False),
+            _get_tf_dataset(config, "test", training=False),
         )
 
+    if config.data.format != "png":
+        return (
+            PackedSequence(config.data.folder, "train", config.data.batch_size, shuffle=True),
+            PackedSequence(config.data.folder, "validation", config.data.batch_size, shuffle=False),
+            PackedSequence(config.data.folder, "test", config.data.batch_size, shuffle=False),
+        )
 
-def get_train_val_datasets(config: Config) -> tuple[ImageDataGenerator, ImageDataGenerator, ImageDataGenerator]:
     train_datagen = ImageDataGenerator()
     validation_datagen = ImageDataGenerator()
     test_datagen = ImageDataGenerator()
 
-    train_generator = train_datagen.flow_from_directory(
+    # Construit directement plutôt que par flow_from_directory, pour mélanger avec son propre générateur
+    train_generator = ShuffledDirectoryIterator(
         config.data.folder / "train",
-        target_size=config.image_size,
+        train_datagen,
+        target_size=config.input_shape[:2],
         batch_size=config.data.batch_size,
         class_mode="sparse",
         color_mode="grayscale",
@@ -83,7 +587,7 @@ def get_train_val_datasets(config: Config) -> tuple[ImageDataGenerator, ImageDat
 
     validation_generator = validation_datagen.flow_from_directory(
         config.data.folder / "validation",
-        target_size=config.image_size,
+        target_size=config.input_shape[:2],
         batch_size=config.data.batch_size,
         class_mode="sparse",
         color_mode="grayscale",
@@ -92,7 +596,7 @@ def get_train_val_datasets(config: Config) -> tuple[ImageDataGenerator, ImageDat
 
     test_generator = test_datagen.flow_from_directory(
         config.data.folder / "test",
-        target_size=config.image_size,
+        target_size=config.input_shape[:2],
         batch_size=config.data.batch_size,
         class_mode="sparse",
         color_mode="grayscale",
@@ -100,3 +604,37 @@ def get_train_val_datasets(config: Config) -> tuple[ImageDataGenerator, ImageDat
     )
 
     return train_generator, validation_generator, test_generator
+
+
+def iter_batches(dataset: Dataset) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    if isinstance(dataset, tf.data.Dataset):
+        yield from dataset.as_numpy_iterator()
+    else:
+        for i in range(len(dataset)):
+            yield dataset[i]
+
+
+def skip_batches(dataset: Dataset, start: int) -> Sequence | tf.data.Dataset:
+    if isinstance(dataset, tf.data.Dataset):
+        return dataset.skip(start)
+    return SkippedSequence(dataset, start)
+
+
+def get_shuffle_state(dataset: Dataset) -> tuple[np.ndarray, Any] | None:
+    # Ordre de l'époque en cours et état du générateur qui tirera le suivant, inaccessibles avec tf.data
+    if isinstance(dataset, PackedSequence):
+        return dataset._order.copy(), dataset._rng.bit_generator.state
+    if isinstance(dataset, ShuffledDirectoryIterator):
+        if dataset.index_array is None:
+            dataset._set_index_array()
+        return dataset.index_array.copy(), dataset._rng.bit_generator.state
+    return None
+
+
+def set_shuffle_state(dataset: Dataset, order: np.ndarray, rng_state: Any) -> None:
+    if isinstance(dataset, PackedSequence):
+        dataset._order = order
+        dataset._rng.bit_generator.state = rng_state
+    elif isinstance(dataset, ShuffledDirectoryIterator):
+        dataset.index_array = order
+        dataset._rng.bit_generator.state = rng_state
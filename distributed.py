@@ -0,0 +1,123 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+import tensorflow as tf
+
+from schemas import Config
+
+# Intervalle de surveillance des workers locaux, en secondes
+POLL_INTERVAL = 0.5
+
+
+def get_tf_config() -> dict:
+    return json.loads(os.environ.get("TF_CONFIG", "{}"))
+
+
+def task_info() -> tuple[int, int]:
+    # Index du worker et nombre de workers, le chef éventuel compte comme worker 0
+    tf_config = get_tf_config()
+    cluster, task = tf_config.get("cluster", {}), tf_config.get("task", {})
+    n_chiefs = len(cluster.get("chief", []))
+    num_workers = n_chiefs + len(cluster.get("worker", []))
+
+    if task.get("type") == "worker":
+        return n_chiefs + task.get("index", 0), num_workers
+    return 0, max(num_workers, 1)
+
+
+def is_chief() -> bool:
+    return task_info()[0] == 0
+
+
+def get_strategy(config: Config) -> tf.distribute.Strategy:
+    if config.distribution.strategy == "multi_worker":
+        implementation = {
+            "auto": tf.distribute.experimental.CommunicationImplementation.AUTO,
+            "ring": tf.distribute.experimental.CommunicationImplementation.RING,
+        }[config.distribution.communication]
+        return tf.distribute.MultiWorkerMirroredStrategy(
+            communication_options=tf.distribute.experimental.CommunicationOptions(implementation=implementation)
+        )
+
+    return tf.distribute.get_strategy()
+
+
+def global_batch_size(config: Config, strategy: tf.distribute.Strategy) -> int:
+    if config.distribution.batch_size == "per_replica":
+        return config.data.batch_size * strategy.num_replicas_in_sync
+    return config.data.batch_size
+
+
+def _free_ports(count: int) -> list[int]:
+    sockets = [socket.socket() for _ in range(count)]
+    for sock in sockets:
+        sock.bind(("localhost", 0))
+    ports = [sock.getsockname()[1] for sock in sockets]
+    for sock in sockets:
+        sock.close()
+    return ports
+
+
+def launch_local_workers(config_path: Path, config: Config, num_workers: int, log_folder: Path) -> int:
+    from common import generate_run_name
+    from data import generate_data
+
+    # Les données sont générées une seule fois avant de démarrer les workers
+    generate_data(config)
+    generate_run_name(config)
+
+    cluster = {"worker": [f"localhost:{port}" for port in _free_ports(num_workers)]}
+    log_folder.mkdir(parents=True, exist_ok=True)
+
+    processes = []
+    for index in range(num_workers):
+        env = {
+            **os.environ,
+            "TF_CONFIG": json.dumps({"cluster": cluster, "task": {"type": "worker", "index": index}}),
+            "CUDA_VISIBLE_DEVICES": "",
+        }
+        command = [sys.executable, str(Path(__file__).parent / "train.py"), str(config_path), "--run-name", config.run_name]
+        # Seul le chef écrit dans le terminal, les autres workers dans leur fichier de log
+        output = None if index == 0 else open(log_folder / f"{config.run_name}-worker-{index}.log", "w")
+        processes.append(subprocess.Popen(command, env=env, stdout=output, stderr=output))
+
+    # Tous les workers sont surveillés : le premier qui échoue arrête les autres, bloqués sinon dans les collectives
+    exit_code = 0
+    try:
+        running = list(processes)
+        while running and not exit_code:
+            time.sleep(POLL_INTERVAL)
+            for process in list(running):
+                if process.poll() is not None:
+                    running.remove(process)
+                    exit_code = exit_code or process.returncode
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+        for process in processes:
+            process.wait()
+
+    return exit_code
+
+
+if __name__ == "__main__":
+    from schemas import get_config
+
+    parser = ArgumentParser(prog="Launch local training workers")
+    parser.add_argument("config_path", nargs="?", default="config.yaml", type=Path)
+    parser.add_argument("--workers", default=2, type=int)
+    parser.add_argument("--log-folder", default=Path("./logs"), type=Path)
+    args = parser.parse_args()
+
+    config = get_config(args.config_path)
+    if config.distribution.strategy != "multi_worker":
+        parser.error("Set distribution.strategy to 'multi_worker' in the configuration to launch workers.")
+
+    sys.exit(launch_local_workers(args.config_path, config, args.workers, args.log_folder))
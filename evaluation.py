@@ -0,0 +1,153 @@
+import numpy as np
+import tensorflow as tf
+from keras.models import Model
+
+from data import Dataset, iter_batches
+
+
+class EarlyExitMetrics:
+    def __init__(self, exit_names: list[str], threshold: float):
+        self.exit_names = exit_names
+        self.threshold = threshold
+        # Échantillons sortis à chaque tête et bonnes réponses parmi eux
+        self.exit_counts = np.zeros(len(exit_names), dtype=np.int64)
+        self.exit_correct = np.zeros(len(exit_names), dtype=np.int64)
+        # Chaque tête évaluée seule sur tous les échantillons
+        self.head_correct = np.zeros(len(exit_names), dtype=np.int64)
+
+    @property
+    def samples(self) -> int:
+        return int(self.exit_counts.sum())
+
+    @property
+    def accuracy(self) -> float:
+        return float(self.exit_correct.sum()) / max(self.samples, 1)
+
+    @property
+    def mean_stages(self) -> float:
+        # Nombre moyen d'étages calculés par dessin, le coût relatif à la profondeur complète
+        return float(np.sum(self.exit_counts * np.arange(1, len(self.exit_names) + 1))) / max(self.samples, 1)
+
+    @property
+    def usage(self) -> dict[str, float]:
+        return dict(zip(self.exit_names, (self.exit_counts / max(self.samples, 1)).tolist()))
+
+    @property
+    def exit_accuracy(self) -> dict[str, float]:
+        return dict(zip(self.exit_names, (self.exit_correct / np.maximum(self.exit_counts, 1)).tolist()))
+
+    @property
+    def head_accuracy(self) -> dict[str, float]:
+        return dict(zip(self.exit_names, (self.head_correct / max(self.samples, 1)).tolist()))
+
+    def update(self, labels: np.ndarray, probabilities: list[np.ndarray]) -> None:
+        labels = labels.astype(np.int64)
+        correct = np.stack([np.argmax(p, axis=1) == labels for p in probabilities])
+        self.head_correct += correct.sum(axis=1)
+
+        # Sortie à la première tête assez confiante, la tête finale répond pour les autres
+        confident = np.stack([np.max(p, axis=1) >= self.threshold for p in probabilities])
+        confident[-1] = True
+        exits = np.argmax(confident, axis=0)
+        self.exit_counts += np.bincount(exits, minlength=len(self.exit_names))
+        self.exit_correct += np.bincount(
+            exits, weights=correct[exits, np.arange(len(labels))], minlength=len(self.exit_names)
+        ).astype(np.int64)
+
+    def summary(self) -> str:
+        lines = [
+            f"Early exits at confidence {self.threshold:.2f}: accuracy {self.accuracy:.4f},"
+            f" {self.mean_stages:.2f}/{len(self.exit_names)} stages per drawing"
+        ]
+        lines += [
+            f"  {name:<10}usage {self.usage[name]:.4f}  accuracy {self.exit_accuracy[name]:.4f}"
+            f"  head accuracy {self.head_accuracy[name]:.4f}"
+            for name in self.exit_names
+        ]
+        return "\n".join(lines)
+
+
+class StreamingMetrics:
+    def __init__(self, class_names: list[str], top_k: tuple[int, ...] = (3, 5)):
+        self.class_names = class_names
+        self.top_k = tuple(k for k in top_k if 1 < k < len(class_names))
+        self.confusion = np.zeros((len(class_names), len(class_names)), dtype=np.int64)
+        self.top_k_correct = dict.fromkeys(self.top_k, 0)
+        self.loss_sum = 0.0
+        self.exits: EarlyExitMetrics | None = None
+
+    @property
+    def samples(self) -> int:
+        return int(self.confusion.sum())
+
+    @property
+    def loss(self) -> float:
+        return self.loss_sum / max(self.samples, 1)
+
+    @property
+    def accuracy(self) -> float:
+        return float(np.trace(self.confusion)) / max(self.samples, 1)
+
+    @property
+    def per_class_accuracy(self) -> dict[str, float]:
+        # Lignes : vraie classe, colonnes : classe prédite
+        support = self.confusion.sum(axis=1)
+        accuracies = np.diag(self.confusion) / np.maximum(support, 1)
+        return dict(zip(self.class_names, accuracies.tolist()))
+
+    @property
+    def top_k_accuracy(self) -> dict[int, float]:
+        return {k: correct / max(self.samples, 1) for k, correct in self.top_k_correct.items()}
+
+    def update(self, labels: np.ndarray, probabilities: np.ndarray, batch_loss: float) -> None:
+        n_classes = len(self.class_names)
+        labels = labels.astype(np.int64)
+        predictions = np.argmax(probabilities, axis=1)
+
+        self.confusion += np.bincount(labels * n_classes + predictions, minlength=n_classes**2).reshape(
+            n_classes, n_classes
+        )
+        self.loss_sum += batch_loss * len(labels)
+
+        # Rang de la vraie classe : nombre de classes strictement plus probables
+        true_probabilities = probabilities[np.arange(len(labels)), labels]
+        ranks = np.sum(probabilities > true_probabilities[:, np.newaxis], axis=1)
+        for k in self.top_k:
+            self.top_k_correct[k] += int(np.sum(ranks < k))
+
+    def summary(self, worst_classes: int = 10) -> str:
+        lines = [f"Test loss: {self.loss:.4f} - Test accuracy: {self.accuracy:.4f} ({self.samples} samples)"]
+        lines += [f"Top-{k} accuracy: {accuracy:.4f}" for k, accuracy in self.top_k_accuracy.items()]
+
+        per_class = sorted(self.per_class_accuracy.items(), key=lambda item: item[1])
+        lines.append("Least accurate classes:")
+        lines += [f"  {name:<20}{accuracy:.4f}" for name, accuracy in per_class[:worst_classes]]
+        if self.exits is not None:
+            lines.append(self.exits.summary())
+        return "\n".join(lines)
+
+
+def evaluate_model(
+    model: Model, dataset: Dataset, class_names: list[str], exit_threshold: float | None = None
+) -> StreamingMetrics:
+    metrics = StreamingMetrics(class_names)
+    early_exits = len(model.outputs) > 1
+    if early_exits and exit_threshold is not None:
+        metrics.exits = EarlyExitMetrics(model.output_names, exit_threshold)
+
+    @tf.function(reduce_retracing=True)
+    def evaluate_batch(x, y):
+        outputs = model(x, training=False)
+        # Avec des sorties anticipées, la perte et les métriques principales sont celles de la tête finale
+        probabilities = outputs[-1] if early_exits else outputs
+        return outputs, model.loss(y, probabilities)
+
+    # Une seule passe sur le jeu de test, la mémoire ne dépend que de la taille des lots
+    for x, y in iter_batches(dataset):
+        outputs, batch_loss = evaluate_batch(tf.constant(x, tf.float32), tf.constant(y, tf.float32))
+        probabilities = [output.numpy() for output in outputs] if early_exits else [outputs.numpy()]
+        metrics.update(y, probabilities[-1], float(batch_loss))
+        if metrics.exits is not None:
+            metrics.exits.update(y, probabilities)
+
+    return metrics
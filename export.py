@@ -0,0 +1,132 @@
+import os
+
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "2"
+
+import json  # noqa: E402
+import time  # noqa: E402
+from argparse import ArgumentParser  # noqa: E402
+from itertools import islice  # noqa: E402
+from pathlib import Path  # noqa: E402
+from typing import Callable, Iterator  # noqa: E402
+
+import numpy as np  # noqa: E402
+import tensorflow as tf  # noqa: E402
+
+from common import generate_model, get_config  # noqa: E402
+from data import Dataset, get_train_val_datasets, iter_batches  # noqa: E402
+from inference import TFLiteModel  # noqa: E402
+from schemas import Config  # noqa: E402
+
+
+def convert(model: tf.keras.Model, validation: Dataset, mode: str, representative_samples: int) -> bytes:
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    if mode == "int8":
+
+        def representative_dataset() -> Iterator[list[np.ndarray]]:
+            samples = (x[i : i + 1] for x, _ in iter_batches(validation) for i in range(len(x)))
+            for sample in islice(samples, representative_samples):
+                yield [sample.astype(np.float32)]
+
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+
+    return converter.convert()
+
+
+def evaluate(predict: Callable[[np.ndarray], np.ndarray], test: Dataset, max_samples: int | None) -> float:
+    correct, total = 0, 0
+    for x, y in iter_batches(test):
+        if max_samples is not None:
+            x, y = x[: max_samples - total], y[: max_samples - total]
+            if len(x) == 0:
+                break
+        correct += int(np.sum(np.argmax(predict(x.astype(np.float32)), axis=1) == y))
+        total += len(x)
+
+    return correct / total
+
+
+def latency_ms(predict: Callable[[np.ndarray], np.ndarray], input_shape: tuple[int, ...], runs: int = 200) -> float:
+    sample = np.zeros((1,) + input_shape, dtype=np.float32)
+    predict(sample)
+
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        predict(sample)
+        latencies.append(time.perf_counter() - start)
+
+    return float(np.percentile(latencies, 50) * 1000)
+
+
+def export(
+    config: Config, model_path: Path, output_dir: Path, representative_samples: int, max_test_samples: int | None
+) -> dict:
+    output_dir.mkdir(parents=True, exist_ok=True)
+    _, validation, test = get_train_val_datasets(config)
+    input_shape = config.input_shape
+
+    model = generate_model(config, model_path)
+    if len(model.outputs) > 1:
+        # Sans sortie anticipée en TFLite, seule la tête finale est exportée
+        model = tf.keras.Model(model.inputs, model.outputs[-1])
+    keras_predict = tf.function(lambda x: model(x, training=False))
+
+    def predict(x: np.ndarray) -> np.ndarray:
+        return keras_predict(x).numpy()
+
+    report = {
+        "keras": {
+            "path": str(model_path),
+            "size_bytes": model_path.stat().st_size,
+            "accuracy": evaluate(predict, test, max_test_samples),
+            "latency_p50_ms": latency_ms(predict, input_shape),
+        }
+    }
+
+    for mode in ["dynamic", "int8"]:
+        tflite_path = output_dir / f"{model_path.stem}_{mode}.tflite"
+        tflite_path.write_bytes(convert(model, validation, mode, representative_samples))
+
+        tflite_model = TFLiteModel(tflite_path)
+        report[mode] = {
+            "path": str(tflite_path),
+            "size_bytes": tflite_path.stat().st_size,
+            "accuracy": evaluate(tflite_model, test, max_test_samples),
+            "latency_p50_ms": latency_ms(tflite_model, input_shape),
+        }
+
+    return report
+
+
+def print_report(report: dict) -> None:
+    reference = report["keras"]
+    print(f"{'backend':<10}{'size (KB)':>12}{'accuracy':>10}{'delta':>9}{'p50 ms':>9}{'speedup':>9}")
+    for backend, row in report.items():
+        print(
+            f"{backend:<10}{row['size_bytes'] / 1024:>12.0f}{row['accuracy']:>10.4f}"
+            f"{row['accuracy'] - reference['accuracy']:>+9.4f}{row['latency_p50_ms']:>9.2f}"
+            f"{reference['latency_p50_ms'] / row['latency_p50_ms']:>8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("model_path", nargs="?", default="best_model.keras", type=Path)
+    parser.add_argument("config_path", nargs="?", default="config.yaml", type=Path)
+    parser.add_argument("--output-dir", default=Path("models"), type=Path)
+    parser.add_argument("--representative-samples", default=500, type=int)
+    parser.add_argument("--max-test-samples", default=None, type=int)
+
+    args = parser.parse_args()
+    config = get_config(args.config_path)
+
+    report = export(config, args.model_path, args.output_dir, args.representative_samples, args.max_test_samples)
+    print_report(report)
+
+    with open(args.output_dir / f"{args.model_path.stem}_export_report.json", "w") as report_file:
+        json.dump(report, report_file, indent=2)
@@ -0,0 +1,513 @@
+import hashlib
+import queue
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import Future
+from pathlib import Path
+from functools import partial
+from typing import Callable, Literal
+
+import numpy as np
+from PIL import Image
+
+from raster import Strokes
+from schemas import Config
+from strokes import encode_strokes
+
+# TensorFlow et Keras ne sont importés qu'au chargement du modèle, pour que l'interface démarre sans eux
+
+
+class TFLiteModel:
+    def __init__(self, model_path: Path, num_threads: int | None = None):
+        import tensorflow as tf
+
+        self.interpreter = tf.lite.Interpreter(model_path=str(model_path), num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        if tuple(self._input["shape"]) != x.shape:
+            self.interpreter.resize_tensor_input(self._input["index"], x.shape)
+            self.interpreter.allocate_tensors()
+            self._input = self.interpreter.get_input_details()[0]
+            self._output = self.interpreter.get_output_details()[0]
+
+        # Modèle entièrement int8 : entrées quantifiées et sorties déquantifiées ici
+        input_scale, input_zero_point = self._input["quantization"]
+        if self._input["dtype"] != np.float32:
+            x = np.round(x / input_scale + input_zero_point).astype(self._input["dtype"])
+
+        self.interpreter.set_tensor(self._input["index"], x)
+        self.interpreter.invoke()
+        output = self.interpreter.get_tensor(self._output["index"])
+
+        output_scale, output_zero_point = self._output["quantization"]
+        if self._output["dtype"] != np.float32:
+            output = (output.astype(np.float32) - output_zero_point) * output_scale
+
+        return output
+
+
+class PredictionCache:
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._entries: OrderedDict[bytes, tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(arr: np.ndarray) -> bytes:
+        # Une image binaire s'identifie avec 1 bit par pixel, une séquence de points par ses valeurs
+        if np.all((arr == 0) | (arr == 1)):
+            data = np.packbits(arr.astype(bool)).tobytes()
+        else:
+            data = arr.astype(np.float32).tobytes()
+        return hashlib.blake2b(data + str(arr.shape).encode(), digest_size=16).digest()
+
+    def get(self, arr: np.ndarray) -> tuple[str, float] | None:
+        key = self.key(arr)
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return result
+
+    def put(self, arr: np.ndarray, result: tuple[str, float]) -> None:
+        key = self.key(arr)
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class ModelManager:
+    def __init__(
+        self,
+        model_path: Path,
+        config: Config,
+        jit_compile: bool = False,
+        backend: Literal["keras", "tflite"] = "keras",
+        cache: PredictionCache | None = None,
+        exit_threshold: float | None = None,
+    ):
+        self.model_path = model_path
+        self.config = config
+        self.jit_compile = jit_compile
+        self.backend = backend
+        self.cache = cache
+        self.input_shape = config.input_shape
+        # Les labels d'entraînement suivent l'ordre alphabétique des classes, pas celui de la configuration
+        self.class_names = sorted(config.data.classes)
+        self.uses_strokes = config.data.format == "strokes"
+
+        # Le modèle TFLite exporté ne garde que la tête finale
+        self.early_exits = config.early_exits is not None and backend == "keras"
+        if exit_threshold is None and config.early_exits is not None:
+            exit_threshold = config.early_exits.threshold
+        self.exit_threshold = exit_threshold
+        self.exit_counts = np.zeros(len(config.architecture.stage_depths) if self.early_exits else 0, dtype=np.int64)
+        self._exit_lock = threading.Lock()
+
+        self._load_model()
+
+    def _load_model(self):
+        if self.backend == "tflite":
+            self._infer = TFLiteModel(self.model_path)
+            self._infer_batch = self._infer
+        elif self.early_exits:
+            from models import build_model
+
+            self.model = build_model(self.config, self.model_path)
+            self._load_segments()
+        else:
+            import tensorflow as tf
+
+            from models import build_model
+
+            self.model = build_model(self.config, self.model_path)
+
+            # Fonction tracée une seule fois pour une entrée de taille fixe, sans la boucle de model.predict
+            traced = tf.function(
+                lambda x: self.model(x, training=False),
+                input_signature=[tf.TensorSpec((1,) + self.input_shape, tf.float32)],
+                jit_compile=self.jit_compile,
+            )
+            self._infer = lambda x: traced(x).numpy()
+
+            traced_batch = tf.function(
+                lambda x: self.model(x, training=False),
+                input_signature=[tf.TensorSpec((None,) + self.input_shape, tf.float32)],
+                jit_compile=self.jit_compile,
+            )
+            self._infer_batch = lambda x: traced_batch(x).numpy()
+
+        self.warmup()
+
+    def _load_segments(self) -> None:
+        import tensorflow as tf
+
+        # Un étage et sa tête par fonction tracée : un dessin assez sûr ne passe pas les étages suivants
+        self._segments = []
+        for name in self.model.output_names:
+            segment = self.model.get_layer(name)
+            self._segments.append(
+                tf.function(
+                    lambda x, segment=segment: segment(x, training=False),
+                    input_signature=[tf.TensorSpec((None,) + segment.input_shape[1:], segment.input.dtype)],
+                    jit_compile=self.jit_compile,
+                )
+            )
+        self._infer = self._infer_batch = self._infer_early_exit
+
+    def _infer_early_exit(self, x: np.ndarray) -> np.ndarray:
+        import tensorflow as tf
+
+        probabilities = np.empty((len(x), len(self.class_names)), dtype=np.float32)
+        remaining = np.arange(len(x))
+        features = tf.constant(x)
+        exits = np.zeros_like(self.exit_counts)
+        for index, segment in enumerate(self._segments):
+            if index == len(self._segments) - 1:
+                outputs = segment(features).numpy()
+                confident = np.ones(len(remaining), dtype=bool)
+            else:
+                features, outputs = segment(features)
+                outputs = outputs.numpy()
+                confident = outputs.max(axis=1) >= self.exit_threshold
+
+            probabilities[remaining[confident]] = outputs[confident]
+            exits[index] = int(confident.sum())
+            remaining = remaining[~confident]
+            if len(remaining) == 0:
+                break
+            features = tf.boolean_mask(features, ~confident)
+
+        with self._exit_lock:
+            self.exit_counts += exits
+        return probabilities
+
+    def exit_stats(self) -> dict | None:
+        if not self.early_exits:
+            return None
+
+        with self._exit_lock:
+            counts = self.exit_counts.copy()
+        predictions = int(counts.sum())
+        return {
+            "threshold": self.exit_threshold,
+            "predictions": predictions,
+            "mean_stages": float(np.sum(counts * np.arange(1, len(counts) + 1))) / max(predictions, 1),
+            "usage": {
+                name: int(count) / max(predictions, 1) for name, count in zip(self.model.output_names, counts)
+            },
+        }
+
+    def warmup(self) -> None:
+        self._infer(np.zeros((1,) + self.input_shape, dtype=np.float32))
+        # Le préchauffage ne compte pas dans l'usage des sorties
+        self.exit_counts[:] = 0
+
+    def _get_drawing_zone(self, img: np.ndarray, bbox: tuple[int, int, int, int]) -> np.ndarray:
+        # img est transposé : ses lignes sont les y du canevas et ses colonnes les x
+        ymin, xmin, ymax, xmax = bbox
+
+        side_length = max(xmax - xmin, ymax - ymin, 1)
+
+        xcenter = (xmin + xmax) / 2
+        ycenter = (ymin + ymax) / 2
+
+        xmin = max(0, int(xcenter - side_length / 2))
+        ymin = max(0, int(ycenter - side_length / 2))
+
+        xmax = xmin + side_length
+        ymax = ymin + side_length
+
+        padding = 20
+        xmin, ymin, xmax, ymax = self._ensure_within_bounds(img.shape, xmin, ymin, xmax, ymax, padding, side_length)
+
+        cropped_square = img[xmin:xmax, ymin:ymax]
+        return cropped_square
+
+    def _ensure_within_bounds(
+        self, img_shape: tuple, xmin: int, ymin: int, xmax: int, ymax: int, padding: int, side_length: int
+    ) -> tuple:
+        if xmax >= img_shape[0]:
+            xmax = img_shape[0] - 1
+            xmin = max(0, xmax - side_length - 2 * padding)
+        if ymax >= img_shape[1]:
+            ymax = img_shape[1] - 1
+            ymin = max(0, ymax - side_length - 2 * padding)
+
+        xmin = max(0, xmin)
+        ymin = max(0, ymin)
+        return xmin, ymin, xmax, ymax
+
+    def preprocess(self, input: np.ndarray, bbox: tuple[int, int, int, int]) -> np.ndarray:
+        input_cropped = self._get_drawing_zone(input.T, bbox)
+        img = Image.fromarray(input_cropped).resize(self.config.image_size)
+        arr = np.array(img)
+
+        arr = arr // 255
+        threshold = 0.9
+        arr = np.where(arr <= threshold, 0, 1)
+
+        return arr.reshape(self.input_shape).astype(np.float32)
+
+    def _postprocess(self, output: np.ndarray) -> tuple[str, float]:
+        output_idx = int(np.argmax(output))
+        prob = float(output[output_idx])
+
+        return self.class_names[output_idx], prob * 100
+
+    def predict_array(self, arr: np.ndarray) -> tuple[str, float]:
+        if self.cache is not None:
+            result = self.cache.get(arr)
+            if result is not None:
+                return result
+
+        result = self._postprocess(self._infer(arr[np.newaxis])[0])
+
+        if self.cache is not None:
+            self.cache.put(arr, result)
+        return result
+
+    def predict_batch(self, arrs: np.ndarray, lookup_cache: bool = True) -> list[tuple[str, float]]:
+        results: list[tuple[str, float] | None] = [None] * len(arrs)
+        if self.cache is not None and lookup_cache:
+            results = [self.cache.get(arr) for arr in arrs]
+
+        # Seules les entrées absentes du cache passent par le modèle
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            outputs = self._infer_batch(arrs[missing])
+            for i, output in zip(missing, outputs):
+                results[i] = self._postprocess(output)
+                if self.cache is not None:
+                    self.cache.put(arrs[i], results[i])
+
+        return results
+
+    def predict(self, input: np.ndarray, bbox: tuple[int, int, int, int]) -> tuple[str, float]:
+        return self.predict_array(self.preprocess(input, bbox))
+
+    def preprocess_strokes(self, strokes: Strokes) -> np.ndarray:
+        return encode_strokes(strokes, self.config.strokes.length, self.config.strokes.simplify_epsilon)
+
+    def predict_strokes(self, strokes: Strokes) -> tuple[str, float]:
+        return self.predict_array(self.preprocess_strokes(strokes))
+
+
+class InferenceWorker:
+    def __init__(self, model_manager: ModelManager):
+        self.model_manager = model_manager
+
+        self._condition = threading.Condition()
+        self._pending: tuple[Callable[[], tuple[str, float]], float, int] | None = None
+        self._result: tuple[str, float] | None = None
+        self._generation = 0
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+        self.submitted = 0
+        self.dropped = 0
+        self.completed = 0
+        self.failed = 0
+        self.last_error: Exception | None = None
+        self.latencies: deque[float] = deque(maxlen=100)
+
+    @property
+    def queue_depth(self) -> int:
+        with self._condition:
+            return int(self._pending is not None)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+    def submit(self, pixels: np.ndarray, bbox: tuple[int, int, int, int]) -> None:
+        self._submit(partial(self.model_manager.predict, pixels.copy(), bbox))
+
+    def submit_strokes(self, strokes: Strokes) -> None:
+        self._submit(partial(self.model_manager.predict_strokes, [list(stroke) for stroke in strokes]))
+
+    def _submit(self, predict: Callable[[], tuple[str, float]]) -> None:
+        # File à une place : la dernière demande remplace celle qui n'a pas encore été traitée
+        with self._condition:
+            if self._pending is not None:
+                self.dropped += 1
+            self._pending = (predict, time.perf_counter(), self._generation)
+            self.submitted += 1
+            self._condition.notify()
+
+    def cancel(self) -> None:
+        with self._condition:
+            if self._pending is not None:
+                self.dropped += 1
+            self._pending = None
+            self._result = None
+            self._generation += 1
+
+    def poll(self) -> tuple[str, float] | None:
+        with self._condition:
+            result, self._result = self._result, None
+            return result
+
+    def stats(self) -> dict[str, float]:
+        with self._condition:
+            latencies = np.array(self.latencies) * 1000
+            return {
+                "queue_depth": int(self._pending is not None),
+                "submitted": self.submitted,
+                "dropped": self.dropped,
+                "completed": self.completed,
+                "failed": self.failed,
+                "latency_p50_ms": float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+                "latency_p99_ms": float(np.percentile(latencies, 99)) if len(latencies) else 0.0,
+            }
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while self._pending is None and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                predict, submitted_at, generation = self._pending
+                self._pending = None
+
+            try:
+                result = predict()
+            except Exception as e:
+                # Un dessin qui fait échouer la prédiction ne doit pas arrêter le fil : les suivants restent prédits
+                print(f"Prediction failed: {e!r}")
+                with self._condition:
+                    self.failed += 1
+                    self.last_error = e
+                continue
+
+            with self._condition:
+                self.completed += 1
+                self.latencies.append(time.perf_counter() - submitted_at)
+                # Un effacement du canevas pendant la prédiction rend le résultat obsolète
+                if generation == self._generation:
+                    self._result = result
+
+
+class MicroBatcher:
+    WAIT_BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, float("inf"))
+
+    def __init__(self, model_manager: ModelManager, max_batch_size: int = 32, max_wait: float = 0.005):
+        self.model_manager = model_manager
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self._queue: queue.Queue[tuple[np.ndarray, Future, float]] = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+        self.started_at = time.perf_counter()
+        self.completed = 0
+        self.batch_sizes: Counter[int] = Counter()
+        self.queue_waits: Counter[float] = Counter()
+
+    def start(self) -> None:
+        self.started_at = time.perf_counter()
+        self._thread.start()
+
+    def submit(self, arr: np.ndarray) -> Future:
+        future: Future = Future()
+
+        cache = self.model_manager.cache
+        result = cache.get(arr) if cache is not None else None
+        if result is not None:
+            future.set_result(result)
+        else:
+            self._queue.put((arr, future, time.perf_counter()))
+
+        return future
+
+    def predict(self, arr: np.ndarray) -> tuple[str, float]:
+        return self.submit(arr).result()
+
+    def stats(self) -> dict:
+        cache = self.model_manager.cache
+        with self._lock:
+            elapsed = time.perf_counter() - self.started_at
+            return {
+                "cache": cache.stats() if cache is not None else None,
+                "exits": self.model_manager.exit_stats(),
+                "completed": self.completed,
+                "throughput_per_s": self.completed / elapsed if elapsed > 0 else 0.0,
+                "queue_depth": self._queue.qsize(),
+                "batch_size_histogram": dict(sorted(self.batch_sizes.items())),
+                "queue_wait_ms_histogram": {
+                    f"<={bucket:g}": self.queue_waits[bucket] for bucket in self.WAIT_BUCKETS_MS
+                },
+            }
+
+    def _collect(self) -> list[tuple[np.ndarray, Future, float]]:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+
+        # On attend au plus max_wait après la première requête pour remplir le lot
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            started_at = time.perf_counter()
+
+            try:
+                # Le cache a déjà été consulté à la soumission
+                arrs = np.stack([arr for arr, _, _ in batch])
+                results = self.model_manager.predict_batch(arrs, lookup_cache=False)
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+
+            with self._lock:
+                self.completed += len(batch)
+                self.batch_sizes[len(batch)] += 1
+                for _, _, submitted_at in batch:
+                    wait_ms = 1000 * (started_at - submitted_at)
+                    self.queue_waits[next(b for b in self.WAIT_BUCKETS_MS if wait_ms <= b)] += 1
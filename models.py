@@ -0,0 +1,22 @@
+from pathlib import Path
+
+from keras.models import Model
+
+from schemas import Config
+
+
+def build_model(config: Config, weights_path: Path | None = None) -> Model:
+    # Les séquences de points ont leur propre encodeur, les images passent par le ResNet
+    if config.data.format == "strokes":
+        from sequence_model import build_stroke_encoder
+
+        model = build_stroke_encoder(config)
+    else:
+        from resnet import build_resnet
+
+        model = build_resnet(config)
+
+    if weights_path is not None:
+        model.load_weights(weights_path)
+
+    return model
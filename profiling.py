@@ -0,0 +1,171 @@
+import json
+import resource
+import sys
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import tensorflow as tf
+from keras.callbacks import Callback
+from keras.utils import Sequence
+
+from schemas import Config
+
+# Horodatages en attente d'un pipeline tf.data : le pas d'entraînement en consomme un par lot
+MAX_PENDING_STAMPS = 1024
+
+
+def host_rss_mb() -> float:
+    try:
+        with open("/proc/self/statm", "r") as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize() / 2**20
+    except OSError:
+        # Hors Linux, on se rabat sur le pic de mémoire, en octets sous macOS et en Ko ailleurs
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss / 2**20 if sys.platform == "darwin" else max_rss / 2**10
+
+
+class TimedSequence(Sequence):
+    # Même chargeur, horodatant chaque lot quand il est produit par le fil de lecture de model.fit
+    def __init__(self, sequence: Sequence, ready_times: deque[float]):
+        super().__init__()
+        self.sequence = sequence
+        self.ready_times = ready_times
+
+    def __len__(self) -> int:
+        return len(self.sequence)
+
+    def __getitem__(self, idx: int) -> tuple[np.ndarray, np.ndarray]:
+        batch = self.sequence[idx]
+        self.ready_times.append(time.time())
+        return batch
+
+    def on_epoch_end(self) -> None:
+        self.sequence.on_epoch_end()
+
+
+class ThroughputProfiler(Callback):
+    def __init__(self, config: Config):
+        super().__init__()
+        self.log_interval = config.profiling.log_interval
+        self.output = config.profiling.output or Path(f"./logs/profile-{config.run_name}.jsonl")
+        self.trace_steps = config.profiling.trace_steps
+        self.trace_folder = config.profiling.trace_folder
+        self.batch_size = config.data.batch_size
+        self.use_wandb = config.wandb_parameters is not None
+
+        # Instants où chaque lot d'entraînement est prêt, notés par instrument()
+        self.ready_times: deque[float] = deque()
+        self.stamps: tf.queue.FIFOQueue | None = None
+        self.step = 0
+        self.tracing = False
+        self.interval: list[tuple[float, float, float]] = []
+        self.epoch: list[tuple[float, float]] = []
+
+    def instrument(self, data: "Sequence | tf.data.Dataset") -> "Sequence | tf.data.Dataset":
+        if not isinstance(data, tf.data.Dataset):
+            return TimedSequence(data, self.ready_times)
+
+        # Dernière étape du pipeline, sans prefetch après elle : elle s'exécute quand le pas d'entraînement
+        # demande le lot, et l'horodatage est l'instant où le lot lui est remis
+        self.stamps = tf.queue.FIFOQueue(MAX_PENDING_STAMPS, tf.float64, shapes=[])
+
+        def stamp(x: tf.Tensor, y: tf.Tensor) -> tuple[tf.Tensor, tf.Tensor]:
+            with tf.control_dependencies([self.stamps.enqueue(tf.timestamp())]):
+                return tf.identity(x), tf.identity(y)
+
+        return data.map(stamp)
+
+    def _ready_time(self) -> float | None:
+        if self.stamps is not None:
+            return float(self.stamps.dequeue()) if int(self.stamps.size()) else None
+        return self.ready_times.popleft() if self.ready_times else None
+
+    def on_train_begin(self, logs: dict[str, Any] | None = None) -> None:
+        # model.fit lit le premier lot d'une Sequence pour en connaître la forme, hors de tout pas
+        self.ready_times.clear()
+        self.first_step = True
+        self.output.parent.mkdir(parents=True, exist_ok=True)
+        self.output_file = open(self.output, "a")
+
+    def on_epoch_begin(self, epoch: int, logs: dict[str, Any] | None = None) -> None:
+        self.current_epoch = epoch
+        self.epoch = []
+
+    def on_train_batch_begin(self, batch: int, logs: dict[str, Any] | None = None) -> None:
+        if self.trace_steps is not None and self.step == self.trace_steps[0]:
+            tf.profiler.experimental.start(str(self.trace_folder))
+            self.tracing = True
+
+        self.batch_start = time.time()
+
+    def on_train_batch_end(self, batch: int, logs: dict[str, Any] | None = None) -> None:
+        end = time.time()
+
+        # Le lot est lu dans la fonction d'entraînement : l'attente est le temps écoulé
+        # entre le début du pas et l'instant où le lot a été produit
+        ready = self._ready_time() or self.batch_start
+        data_wait = min(max(ready - self.batch_start, 0.0), end - self.batch_start)
+        # Le premier lot n'est demandé qu'une fois la fonction d'entraînement tracée : ce pas est du calcul
+        if self.first_step:
+            data_wait, self.first_step = 0.0, False
+        compute = end - self.batch_start - data_wait
+
+        self.interval.append((data_wait, compute, end))
+        self.epoch.append((data_wait, compute))
+
+        if self.tracing and self.step == self.trace_steps[1]:
+            tf.profiler.experimental.stop()
+            self.tracing = False
+            print(f"\nProfiler trace of steps {self.trace_steps[0]}-{self.trace_steps[1]} saved to {self.trace_folder}")
+
+        self.step += 1
+        if len(self.interval) == self.log_interval:
+            self._log_interval()
+
+    def on_epoch_end(self, epoch: int, logs: dict[str, Any] | None = None) -> None:
+        if not self.epoch:
+            return
+
+        data_wait, compute = np.sum(self.epoch, axis=0)
+        print(
+            f"\nEpoch {epoch + 1} profile: data wait {data_wait:.1f} s, compute {compute:.1f} s"
+            f" ({100 * data_wait / (data_wait + compute):.0f}% waiting on input)"
+        )
+
+    def on_train_end(self, logs: dict[str, Any] | None = None) -> None:
+        if self.interval:
+            self._log_interval()
+        if self.tracing:
+            tf.profiler.experimental.stop()
+            self.tracing = False
+
+        self.output_file.close()
+
+    def _log_interval(self) -> None:
+        data_wait, compute, ends = np.array(self.interval).T
+        elapsed = ends[-1] - ends[0] + data_wait[0] + compute[0]
+        record = {
+            "epoch": self.current_epoch,
+            "step": self.step,
+            "data_wait_ms": 1000 * float(np.mean(data_wait)),
+            "compute_ms": 1000 * float(np.mean(compute)),
+            "data_wait_fraction": float(np.sum(data_wait) / (np.sum(data_wait) + np.sum(compute))),
+            "samples_per_s": len(self.interval) * self.batch_size / elapsed,
+            "rss_mb": host_rss_mb(),
+        }
+        self.interval = []
+
+        print(
+            f"\nstep {record['step']}: data wait {record['data_wait_ms']:.1f} ms, compute {record['compute_ms']:.1f} ms,"
+            f" {record['samples_per_s']:.0f} samples/s, RSS {record['rss_mb']:.0f} MB"
+        )
+        self.output_file.write(json.dumps(record) + "\n")
+        self.output_file.flush()
+
+        if self.use_wandb:
+            import wandb
+
+            wandb.log({f"profiling/{name}": value for name, value in record.items()}, commit=False)
@@ -1,101 +1,55 @@
 import os
 import threading
+import time
+from collections import deque
 
 os.environ["TF_CPP_MIN_LOG_LEVEL"] = "2"
 os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "1"
 
 from argparse import ArgumentParser  # noqa: E402
 from pathlib import Path  # noqa: E402
-from typing import Optional  # noqa: E402
+from typing import Literal, Optional  # noqa: E402
 
 import numpy as np  # noqa: E402
 import pygame  # noqa: E402
-from PIL import Image  # noqa: E402
-from tensorflow import argmax, reduce_max  # noqa: E402
 
-from common import get_config, generate_model  # noqa: E402
-from schemas import Config  # noqa: E402
-
-
-class ModelManager:
-    def __init__(self, model_path: Path, config: Config):
-        self.model_path = model_path
-        self.config = config
-        self._load_model()
-
-    def _load_model(self):
-        self.model = generate_model(self.config, self.model_path)
-
-    def _get_drawing_zone(self, img: np.ndarray) -> np.ndarray:
-        non_white_indices = np.argwhere(img != 255)
-
-        xmin, ymin = np.min(non_white_indices, axis=0)
-        xmax, ymax = np.max(non_white_indices, axis=0)
-
-        side_length = max(xmax - xmin, ymax - ymin)
-
-        xcenter = (xmin + xmax) / 2
-        ycenter = (ymin + ymax) / 2
-
-        xmin = max(0, int(xcenter - side_length / 2))
-        ymin = max(0, int(ycenter - side_length / 2))
-
-        xmax = xmin + side_length
-        ymax = ymin + side_length
-
-        padding = 20
-        xmin, ymin, xmax, ymax = self._ensure_within_bounds(img.shape, xmin, ymin, xmax, ymax, padding, side_length)
-
-        cropped_square = img[xmin:xmax, ymin:ymax]
-        return cropped_square
-
-    def _ensure_within_bounds(
-        self, img_shape: tuple, xmin: int, ymin: int, xmax: int, ymax: int, padding: int, side_length: int
-    ) -> tuple:
-        if xmax >= img_shape[0]:
-            xmax = img_shape[0] - 1
-            xmin = max(0, xmax - side_length - 2 * padding)
-        if ymax >= img_shape[1]:
-            ymax = img_shape[1] - 1
-            ymin = max(0, ymax - side_length - 2 * padding)
-
-        xmin = max(0, xmin)
-        ymin = max(0, ymin)
-        return xmin, ymin, xmax, ymax
-
-    def predict(self, input: np.ndarray) -> tuple[str, float]:
-        input_cropped = self._get_drawing_zone(input.T)
-        img = Image.fromarray(input_cropped).resize((28, 28))
-        arr = np.array(img)
-        arr = np.expand_dims(arr, 0)
-
-        arr = arr // 255
-        threshold = 0.9
-        arr = np.where(arr <= threshold, 0, 1)
-
-        output = self.model.predict(arr, verbose=0)
-
-        output_idx = argmax(output, axis=1)
-        output_idx = reduce_max(output_idx)
-        prob = output[:, output_idx][0]
-
-        return config.data.classes[output_idx], prob * 100
+from canvas import Canvas, Rect  # noqa: E402
+from inference import InferenceWorker, ModelManager, PredictionCache  # noqa: E402
+from schemas import Config, get_config  # noqa: E402
 
 
 class DrawingPredictor:
-    def __init__(self, model_path: Path, config: Config):
-        self.win_h = 640
-        self.win_w = 640
+    def __init__(
+        self,
+        model_path: Path,
+        config: Config,
+        win_size: int = 640,
+        predict_interval: float = 0.25,
+        jit_compile: bool = False,
+        backend: Literal["keras", "tflite"] = "keras",
+        cache_size: int = 256,
+    ):
+        self.win_h = win_size
+        self.win_w = win_size
         self.win_size = (self.win_w, self.win_h)
         self.background = (255, 255, 255)
         self.brush_size = 3
-        self.pixels = np.ones((self.win_h, self.win_w), dtype=np.int16) * 255
+        self.canvas = Canvas(self.win_w, self.win_h)
+        # Points de la souris par trait, l'entrée des modèles à séquences de points
+        self.strokes: list[list[tuple[int, int]]] = []
         self.last: Optional[np.ndarray] = None
         self.drawing = False
         self.model_path = model_path
         self.predicted_class = ""
         self.probability = 0.0
+        self.predict_interval = predict_interval
+        self.jit_compile = jit_compile
+        self.backend = backend
+        self.cache = PredictionCache(cache_size) if cache_size > 0 else None
+        self.last_submit = 0.0
         self.show_help = False
+        self.show_frame_time = False
+        self.frame_times: deque[float] = deque(maxlen=120)
         self.config = config
 
         pygame.init()
@@ -104,13 +58,32 @@ class DrawingPredictor:
         self.clock = pygame.time.Clock()
         self.font = pygame.font.Font(None, 36)
 
+        # Surface persistante du canevas, seuls les rectangles modifiés y sont recopiés
+        self.canvas_surface = pygame.Surface(self.win_size, depth=8)
+        self.canvas_surface.set_palette([(i, i, i) for i in range(256)])
+        pygame.surfarray.blit_array(self.canvas_surface, self.canvas.pixels)
+        self.dirty_rects: list[Rect] = []
+        self.overlay_rects: list[pygame.Rect] = []
+        self.needs_full_redraw = True
+        # Une nouvelle prédiction ne change que le texte affiché par-dessus le canevas
+        self.needs_overlay_redraw = False
+
+    @property
+    def pixels(self) -> np.ndarray:
+        return self.canvas.pixels
+
     def start(self):
         self.loading = True
         threading.Thread(target=self._load_model).start()
         self._run_loading_screen()
 
     def _load_model(self) -> None:
-        self.model_manager = ModelManager(self.model_path, self.config)
+        # Le modèle est tracé et préchauffé ici, pendant l'écran de chargement
+        self.model_manager = ModelManager(
+            self.model_path, self.config, self.jit_compile, self.backend, self.cache
+        )
+        self.inference_worker = InferenceWorker(self.model_manager)
+        self.inference_worker.start()
         self.loading = False
 
     def _run_loading_screen(self) -> None:
@@ -130,32 +103,28 @@ class DrawingPredictor:
 
         self.run()
 
-    def _draw_line(self, current: np.ndarray) -> np.ndarray:
-        if self.last is not None:
-            y1, x1 = self.last
-            y2, x2 = current
-
-            dx = abs(x2 - x1)
-            dy = abs(y2 - y1)
-
-            sx = 1 if x1 < x2 else -1
-            sy = 1 if y1 < y2 else -1
+    def _stamp(self, start: np.ndarray, end: np.ndarray) -> None:
+        rect = self.canvas.stamp_segment(tuple(start), tuple(end), self.brush_size)
+        if rect is None:
+            return
 
-            err = dx - dy
+        x, y, w, h = rect
+        pygame.surfarray.blit_array(self.canvas_surface.subsurface(rect), self.canvas.pixels[x : x + w, y : y + h])
+        self.dirty_rects.append(rect)
 
-            while x1 != x2 or y1 != y2:
-                x_low, x_high = max(x1 - self.brush_size, 0), min(x1 + self.brush_size, self.win_w)
-                y_low, y_high = max(y1 - self.brush_size, 0), min(y1 + self.brush_size, self.win_h)
-                self.pixels[y_low:y_high, x_low:x_high] = 0
+    def _submit_prediction(self) -> None:
+        if self.canvas.is_empty:
+            return
 
-                e2 = err * 2
+        if self.model_manager.uses_strokes:
+            self.inference_worker.submit_strokes(self.strokes)
+        else:
+            self.inference_worker.submit(self.pixels, self.canvas.bbox)
+        self.last_submit = time.perf_counter()
 
-                if e2 > -dy:
-                    err -= dy
-                    x1 += sx
-                if e2 < dx:
-                    err += dx
-                    y1 += sy
+    def _draw_line(self, current: np.ndarray) -> np.ndarray:
+        if self.last is not None:
+            self._stamp(self.last, current)
 
         return current
 
@@ -177,14 +146,14 @@ class DrawingPredictor:
     def _draw(self) -> None:
         x, y = pygame.mouse.get_pos()
         if 0 <= x < self.win_w and 0 <= y < self.win_h:
-            mouse_pos = np.array((x, y), dtype=np.int16)
+            mouse_pos = np.array((x, y), dtype=np.int64)
             if self.last is not None:
                 self.last = self._draw_line(mouse_pos)
             else:
-                x_low, x_high = max(x - self.brush_size, 0), min(x + self.brush_size, self.win_w)
-                y_low, y_high = max(y - self.brush_size, 0), min(y + self.brush_size, self.win_h)
-                self.pixels[x_low:x_high, y_low:y_high] = 0
+                self._stamp(mouse_pos, mouse_pos)
                 self.last = mouse_pos
+                self.strokes.append([])
+            self.strokes[-1].append((x, y))
 
     def _check_key_events(self, event: pygame.event.EventType) -> None:
         if event.key == pygame.K_ESCAPE:
@@ -198,9 +167,18 @@ class DrawingPredictor:
             self.brush_size -= 1
 
         elif event.key == pygame.K_r:
-            self.pixels = np.ones((self.win_w, self.win_h), dtype=np.int16) * 255
+            self.inference_worker.cancel()
+            self.canvas.clear()
+            self.strokes = []
+            pygame.surfarray.blit_array(self.canvas_surface, self.canvas.pixels)
             self.predicted_class = ""
             self.probability = 0.0
+            self.needs_full_redraw = True
+
+        elif event.key == pygame.K_f:
+            self.show_frame_time = not self.show_frame_time
+            if not self.show_frame_time:
+                pygame.display.set_caption("Tiny Quick Draw")
 
     def _is_help_button_collide(self, position: tuple[int, int]) -> bool:
         button_rect = pygame.Rect(self.win_w - 60, 0, 60, 40)
@@ -211,10 +189,13 @@ class DrawingPredictor:
             if event.type == pygame.MOUSEMOTION:
                 if self.drawing:
                     self._draw()
+                    if self.predict_interval > 0 and time.perf_counter() - self.last_submit >= self.predict_interval:
+                        self._submit_prediction()
 
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 if self._is_help_button_collide(event.pos):
                     self.show_help = not self.show_help
+                    self.needs_full_redraw = True
                 else:
                     self.drawing = True
 
@@ -222,11 +203,7 @@ class DrawingPredictor:
                 if not self._is_help_button_collide(event.pos):
                     self.drawing = False
                     self.last = None
-                    if self.pixels[self.pixels != 255].shape[0] > 0:
-                        (
-                            self.predicted_class,
-                            self.probability,
-                        ) = self.model_manager.predict(self.pixels)
+                    self._submit_prediction()
 
             elif event.type == pygame.QUIT:
                 pygame.quit()
@@ -235,13 +212,13 @@ class DrawingPredictor:
             elif event.type == pygame.KEYDOWN:
                 self._check_key_events(event)
 
-    def _display_prediction(self) -> None:
-        font = pygame.font.Font(None, 36)
+    def _display_prediction(self) -> pygame.Rect:
         msg = "Draw !" if not self.predicted_class else f"{self.predicted_class} {self.probability:.2f}%"
-        text = font.render(msg, True, (0, 0, 0))
+        text = self.font.render(msg, True, (0, 0, 0))
         text_rect = text.get_rect()
         text_rect.center = (self.win_w // 2, 20)
         self.screen.blit(text, text_rect)
+        return text_rect
 
     def _display_help(self) -> None:
         overlay = pygame.Surface((self.win_w, self.win_h))
@@ -252,6 +229,7 @@ class DrawingPredictor:
             "[R] to clear",
             "[U] to increase brush size",
             "[D] to decrease brush size",
+            "[F] to show frame time",
         ]
 
         for i, text in enumerate(texts):
@@ -265,39 +243,109 @@ class DrawingPredictor:
 
         self._draw_help_button("X", (255, 255, 255))
 
-    def _draw_help_button(self, char: str, color: tuple[int, int, int]) -> None:
+    def _draw_help_button(self, char: str, color: tuple[int, int, int]) -> pygame.Rect:
         x_text = self.font.render(char, True, color)
         x_rect = x_text.get_rect(center=(self.win_w - 30, 20))
         self.screen.blit(x_text, x_rect)
+        return x_rect
 
-    def run(self) -> None:
-        while True:
-            self._check_events()
+    def _draw_overlays(self) -> list[pygame.Rect]:
+        # Le texte est redessiné par-dessus le canevas, on efface d'abord l'ancien
+        previous_rects = self.overlay_rects
+        for rect in previous_rects:
+            self.screen.blit(self.canvas_surface, rect, rect)
 
-            self.screen.fill(self.background)
+        self.overlay_rects = [self._display_prediction(), self._draw_help_button("?", (0, 0, 0))]
+        return previous_rects + self.overlay_rects
 
+    def _render_frame(self) -> None:
+        needs_overlay_redraw, self.needs_overlay_redraw = self.needs_overlay_redraw, False
+        if self.needs_full_redraw:
+            self.needs_full_redraw = False
+            self.dirty_rects.clear()
+            self.overlay_rects = []
+
+            self.screen.fill(self.background)
             if self.show_help:
                 self._display_help()
             else:
-                surface = pygame.surfarray.make_surface(self.pixels)
-                self.screen.blit(surface, (0, 0))
+                self.screen.blit(self.canvas_surface, (0, 0))
+                self._draw_overlays()
 
-                self._display_prediction()
+            pygame.display.flip()
 
-                self._draw_help_button("?", (0, 0, 0))
+        elif self.dirty_rects and not self.show_help:
+            updated_rects = [pygame.Rect(rect) for rect in self.dirty_rects]
+            self.dirty_rects.clear()
+
+            for rect in updated_rects:
+                self.screen.blit(self.canvas_surface, rect, rect)
+            updated_rects += self._draw_overlays()
+
+            pygame.display.update(updated_rects)
+
+        elif needs_overlay_redraw and not self.show_help:
+            pygame.display.update(self._draw_overlays())
+
+        else:
+            self.dirty_rects.clear()
+
+    def _check_prediction(self) -> None:
+        result = self.inference_worker.poll()
+        if result is not None:
+            self.predicted_class, self.probability = result
+            self.needs_overlay_redraw = True
+
+    def _record_frame_time(self, frame_time: float) -> None:
+        self.frame_times.append(frame_time)
+        if self.show_frame_time and len(self.frame_times) == self.frame_times.maxlen:
+            times = np.array(self.frame_times) * 1000
+            stats = self.inference_worker.stats()
+            pygame.display.set_caption(
+                f"Tiny Quick Draw - frame {np.mean(times):.2f} ms (max {np.max(times):.2f} ms)"
+                f" - inference p50 {stats['latency_p50_ms']:.1f} ms, dropped {stats['dropped']}/{stats['submitted']}"
+                + (f", cache hits {100 * self.cache.stats()['hit_rate']:.0f}%" if self.cache is not None else "")
+            )
+            self.frame_times.clear()
 
+    def run(self) -> None:
+        while True:
+            start = time.perf_counter()
+
+            self._check_events()
+            self._check_prediction()
+            self._render_frame()
+
+            self._record_frame_time(time.perf_counter() - start)
             self.clock.tick(60)
-            pygame.display.flip()
 
 
 if __name__ == "__main__":
     parser = ArgumentParser(prog="Tiny Quick Draw")
     parser.add_argument("model_path", nargs="?", default="best_model.keras", type=Path)
     parser.add_argument("config_path", nargs="?", default="config.yaml", type=Path)
+    parser.add_argument("--window-size", default=640, type=int)
+    parser.add_argument(
+        "--predict-interval", default=250, type=int, help="Milliseconds between predictions while drawing, 0 to disable"
+    )
+    parser.add_argument("--jit", action="store_true", help="Compile the inference function with XLA")
+    parser.add_argument(
+        "--backend", choices=["keras", "tflite"], default=None, help="Defaults to tflite for .tflite model files"
+    )
+    parser.add_argument("--cache-size", default=256, type=int, help="Cached predictions, 0 to disable")
 
     args = parser.parse_args()
 
     config = get_config(args.config_path)
-
-    predictor = DrawingPredictor(args.model_path, config)
+    backend = args.backend or ("tflite" if args.model_path.suffix == ".tflite" else "keras")
+
+    predictor = DrawingPredictor(
+        args.model_path,
+        config,
+        win_size=args.window_size,
+        predict_interval=args.predict_interval / 1000,
+        jit_compile=args.jit,
+        backend=backend,
+        cache_size=args.cache_size,
+    )
     predictor.start()
@@ -0,0 +1,97 @@
+from typing import Sequence
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+Strokes = Sequence[Sequence[tuple[int, int]]]
+
+# Les dessins QuickDraw simplifiés sont dans un carré de 255x255, comme l'image de get_image
+SOURCE_SIZE = 255
+# Seuil de binarisation du rendu PIL, après redimensionnement
+PIL_THRESHOLD = 0.9
+PIL_STROKE_WIDTH = 3
+
+
+def _segments(drawings: Sequence[Strokes]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    starts, ends, owners = [], [], []
+
+    for i, strokes in enumerate(drawings):
+        for stroke in strokes:
+            points = np.asarray(stroke, dtype=np.float32).reshape(-1, 2)
+            if len(points) == 0:
+                continue
+            if len(points) == 1:
+                points = np.repeat(points, 2, axis=0)
+
+            starts.append(points[:-1])
+            ends.append(points[1:])
+            owners.append(np.full(len(points) - 1, i, dtype=np.int64))
+
+    if not starts:
+        return np.zeros((0, 2), np.float32), np.zeros((0, 2), np.float32), np.zeros(0, np.int64)
+
+    return np.concatenate(starts), np.concatenate(ends), np.concatenate(owners)
+
+
+def rasterize_strokes(
+    drawings: Sequence[Strokes],
+    image_size: tuple[int, int],
+    stroke_width: int = 1,
+    source_size: int = SOURCE_SIZE,
+    out: np.ndarray | None = None,
+) -> np.ndarray:
+    width, height = image_size
+
+    if out is None:
+        out = np.empty((len(drawings), height, width), dtype=np.uint8)
+    out.fill(1)
+
+    starts, ends, owners = _segments(drawings)
+    if len(owners) == 0:
+        return out
+
+    # Passage des coordonnées source aux centres des pixels de la résolution cible
+    scale = np.array([width, height], dtype=np.float32) / source_size
+    starts = (starts + 0.5) * scale - 0.5
+    ends = (ends + 0.5) * scale - 0.5
+
+    # Un échantillon par pixel parcouru au maximum, pour tous les segments en une fois
+    lengths = np.ceil(np.abs(ends - starts).max(axis=1)).astype(np.int64) + 1
+    segment_ids = np.repeat(np.arange(len(lengths)), lengths)
+    first_sample = np.cumsum(lengths) - lengths
+    steps = np.arange(len(segment_ids)) - first_sample[segment_ids]
+    t = (steps / np.maximum(lengths[segment_ids] - 1, 1))[:, None]
+
+    points = starts[segment_ids] + t * (ends[segment_ids] - starts[segment_ids])
+    points = np.floor(points + 0.5).astype(np.int64)
+
+    offsets = np.arange(stroke_width) - (stroke_width - 1) // 2
+    xs = (points[:, 0, None, None] + offsets[None, None, :]).repeat(stroke_width, axis=1).ravel()
+    ys = (points[:, 1, None, None] + offsets[None, :, None]).repeat(stroke_width, axis=2).ravel()
+    ids = np.repeat(owners[segment_ids], stroke_width * stroke_width)
+
+    inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+    out[ids[inside], ys[inside], xs[inside]] = 0
+
+    return out
+
+
+def render_strokes_pil(
+    drawings: Sequence[Strokes], image_size: tuple[int, int], stroke_width: int = PIL_STROKE_WIDTH
+) -> np.ndarray:
+    images = []
+
+    for strokes in drawings:
+        # Même rendu que QuickDrawDrawing.get_image
+        image = Image.new("RGB", (SOURCE_SIZE, SOURCE_SIZE), color=(255, 255, 255))
+        image_draw = ImageDraw.Draw(image)
+        for stroke in strokes:
+            image_draw.line([tuple(point) for point in stroke], fill=(0, 0, 0), width=stroke_width)
+
+        img = np.array(image.resize(image_size).convert("L")) / 255.0
+        images.append(np.where(img <= PIL_THRESHOLD, 0, 1).astype(np.uint8))
+
+    if not images:
+        return np.zeros((0, image_size[1], image_size[0]), dtype=np.uint8)
+
+    return np.stack(images)
@@ -0,0 +1,235 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+import urllib.error
+import urllib.parse
+import urllib.request
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterator, NamedTuple
+
+from raster import Strokes
+from schemas import RawData
+
+# Format binaire QuickDraw : key_id (Q), countrycode (2s), recognized (b), timestamp (I), n_strokes (H),
+# puis pour chaque trait n_points (H) et les n_points x puis les n_points y en octets non signés
+HEADER = struct.Struct("<Q2sbIH")
+N_POINTS = struct.Struct("<H")
+CHUNK_SIZE = 1 << 20
+
+
+class RawDrawing(NamedTuple):
+    key_id: int
+    countrycode: str
+    recognized: bool
+    timestamp: int
+    strokes: Strokes
+
+
+def iter_drawings(buffer: bytes | mmap.mmap) -> Iterator[RawDrawing]:
+    offset = 0
+    while offset + HEADER.size <= len(buffer):
+        key_id, countrycode, recognized, timestamp, n_strokes = HEADER.unpack_from(buffer, offset)
+        offset += HEADER.size
+
+        strokes = []
+        for _ in range(n_strokes):
+            (n_points,) = N_POINTS.unpack_from(buffer, offset)
+            offset += N_POINTS.size
+            xs = buffer[offset : offset + n_points]
+            ys = buffer[offset + n_points : offset + 2 * n_points]
+            offset += 2 * n_points
+            strokes.append(list(zip(xs, ys)))
+
+        yield RawDrawing(key_id, countrycode.decode(), bool(recognized), timestamp, strokes)
+
+
+def encode_drawing(drawing: RawDrawing) -> bytes:
+    chunks = [
+        HEADER.pack(
+            drawing.key_id, drawing.countrycode.encode(), drawing.recognized, drawing.timestamp, len(drawing.strokes)
+        )
+    ]
+    for stroke in drawing.strokes:
+        chunks.append(N_POINTS.pack(len(stroke)))
+        chunks.append(bytes(int(x) for x, _ in stroke) + bytes(int(y) for _, y in stroke))
+    return b"".join(chunks)
+
+
+class RawDataStore:
+    # Les fichiers sont rangés par empreinte SHA-256 dans objects/, refs/<classe>.json pointe vers l'empreinte
+    def __init__(self, cache_folder: Path, base_url: str, offline: bool = False):
+        self.cache_folder = cache_folder
+        self.base_url = base_url if base_url.endswith("/") else base_url + "/"
+        self.offline = offline
+
+    @classmethod
+    def from_config(cls, raw_data: RawData) -> "RawDataStore":
+        return cls(raw_data.cache_folder, raw_data.base_url, raw_data.offline)
+
+    def _ref_path(self, name: str) -> Path:
+        return self.cache_folder / "refs" / f"{name}.json"
+
+    def _object_path(self, sha256: str) -> Path:
+        return self.cache_folder / "objects" / f"{sha256}.bin"
+
+    def url(self, name: str) -> str:
+        return self.base_url + urllib.parse.quote(f"{name}.bin")
+
+    def ref(self, name: str) -> dict | None:
+        ref_path = self._ref_path(name)
+        if not ref_path.exists():
+            return None
+
+        with open(ref_path, "r") as ref_file:
+            return json.load(ref_file)
+
+    def path(self, name: str) -> Path:
+        ref = self.ref(name)
+        if ref is not None:
+            object_path = self._object_path(ref["sha256"])
+            if object_path.exists() and object_path.stat().st_size == ref["size"]:
+                return object_path
+
+        if self.offline:
+            raise FileNotFoundError(
+                f"The raw drawings of '{name}' are not in the cache {self.cache_folder} and raw_data.offline is set."
+                " Run `python rawdata.py prefetch` on a machine with network access and copy the cache folder."
+            )
+
+        return self.fetch(name)
+
+    def fetch(self, name: str) -> Path:
+        objects_folder = self.cache_folder / "objects"
+        objects_folder.mkdir(parents=True, exist_ok=True)
+        self._ref_path(name).parent.mkdir(parents=True, exist_ok=True)
+
+        # Téléchargement dans un fichier temporaire, haché au fil de l'eau puis renommé atomiquement
+        digest, size = hashlib.sha256(), 0
+        with tempfile.NamedTemporaryFile(dir=objects_folder, suffix=".part", delete=False) as part:
+            try:
+                with urllib.request.urlopen(self.url(name), timeout=60) as response:
+                    while chunk := response.read(CHUNK_SIZE):
+                        digest.update(chunk)
+                        part.write(chunk)
+                        size += len(chunk)
+            except (urllib.error.URLError, OSError) as e:
+                os.unlink(part.name)
+                raise ConnectionError(f"Could not download the raw drawings of '{name}' from {self.url(name)}.") from e
+
+        object_path = self._object_path(digest.hexdigest())
+        os.replace(part.name, object_path)
+
+        ref = {"name": name, "sha256": digest.hexdigest(), "size": size, "url": self.url(name)}
+        ref_part = self._ref_path(name).with_suffix(".part")
+        with open(ref_part, "w") as ref_file:
+            json.dump(ref, ref_file, indent=2)
+        os.replace(ref_part, self._ref_path(name))
+
+        return object_path
+
+    def verify(self, name: str) -> bool:
+        ref = self.ref(name)
+        if ref is None or not self._object_path(ref["sha256"]).exists():
+            return False
+
+        digest = hashlib.sha256()
+        with open(self._object_path(ref["sha256"]), "rb") as object_file:
+            while chunk := object_file.read(CHUNK_SIZE):
+                digest.update(chunk)
+        return digest.hexdigest() == ref["sha256"]
+
+    def load_drawings(self, name: str, max_drawings: int, recognized: bool | None = True) -> list[RawDrawing]:
+        drawings: list[RawDrawing] = []
+        path = self.path(name)
+        if path.stat().st_size == 0:
+            return drawings
+
+        # Fichier projeté en mémoire : seul le début est lu, jusqu'au nombre de dessins demandé
+        with open(path, "rb") as object_file:
+            with mmap.mmap(object_file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                for drawing in iter_drawings(buffer):
+                    if recognized is None or drawing.recognized == recognized:
+                        drawings.append(drawing)
+                        if len(drawings) == max_drawings:
+                            break
+
+        return drawings
+
+    def prefetch(self, names: list[str], workers: int = 4) -> list[Path]:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(self.path, names))
+
+
+def write_fixtures(output_folder: Path, class_names: list[str], n_drawings: int) -> None:
+    from benchmarks.fixtures import random_strokes
+
+    output_folder.mkdir(parents=True, exist_ok=True)
+    for label, name in enumerate(class_names):
+        drawings = [
+            RawDrawing(label * n_drawings + i, "FR", True, 0, strokes)
+            for i, strokes in enumerate(random_strokes(n_drawings, seed=label))
+        ]
+        (output_folder / f"{name}.bin").write_bytes(b"".join(encode_drawing(drawing) for drawing in drawings))
+
+
+def serve_folder(folder: Path, host: str, port: int) -> None:
+    from functools import partial
+    from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+    server = ThreadingHTTPServer((host, port), partial(SimpleHTTPRequestHandler, directory=str(folder)))
+    print(f"Serving {folder} on http://{host}:{port}/, set raw_data.base_url to this address")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    from schemas import get_config
+
+    parser = ArgumentParser(prog="QuickDraw raw data store")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    prefetch_parser = subparsers.add_parser("prefetch", help="Download the raw drawings of every configured class")
+    prefetch_parser.add_argument("config_path", nargs="?", default="config.yaml", type=Path)
+    prefetch_parser.add_argument("--workers", default=4, type=int)
+
+    verify_parser = subparsers.add_parser("verify", help="Check the cached files against their checksums")
+    verify_parser.add_argument("config_path", nargs="?", default="config.yaml", type=Path)
+
+    fixtures_parser = subparsers.add_parser("fixtures", help="Write random fixture class files")
+    fixtures_parser.add_argument("output_folder", type=Path)
+    fixtures_parser.add_argument("--classes", nargs="+", required=True)
+    fixtures_parser.add_argument("--drawings", default=100, type=int)
+
+    serve_parser = subparsers.add_parser("serve", help="Serve a folder of class files as a stand-in download server")
+    serve_parser.add_argument("folder", type=Path)
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", default=8765, type=int)
+
+    args = parser.parse_args()
+
+    if args.command == "prefetch":
+        config = get_config(args.config_path)
+        store = RawDataStore.from_config(config.raw_data)
+        for name, path in zip(config.data.classes, store.prefetch(config.data.classes, args.workers)):
+            print(f"{name:<20}{path}")
+    elif args.command == "verify":
+        config = get_config(args.config_path)
+        store = RawDataStore.from_config(config.raw_data)
+        invalid = [name for name in config.data.classes if not store.verify(name)]
+        for name in invalid:
+            print(f"{name}: missing or corrupted")
+        print(f"{len(config.data.classes) - len(invalid)}/{len(config.data.classes)} classes verified")
+        raise SystemExit(1 if invalid else 0)
+    elif args.command == "fixtures":
+        write_fixtures(args.output_folder, args.classes, args.drawings)
+    else:
+        serve_folder(args.folder, args.host, args.port)
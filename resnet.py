@@ -6,22 +6,28 @@ from keras.layers import (
     Conv2D,
     Dense,
     Flatten,
+    GlobalAveragePooling2D,
     Input,
     MaxPooling2D,
+    SeparableConv2D,
     ZeroPadding2D,
 )
 from keras.models import Model
 
+from schemas import Config
+
+
+def convolutional_block(x, filters, strides=(2, 2), separable=False):
+    conv = SeparableConv2D if separable else Conv2D
 
-def convolutional_block(x, filters, strides=(2, 2)):
     x_shortcut = Conv2D(filters, kernel_size=(1, 1), strides=strides, padding="same")(x)
     x_shortcut = BatchNormalization(axis=3)(x_shortcut)
 
-    x = Conv2D(filters, kernel_size=(3, 3), strides=strides, padding="same")(x)
+    x = conv(filters, kernel_size=(3, 3), strides=strides, padding="same")(x)
     x = BatchNormalization(axis=3)(x)
     x = Activation("relu")(x)
 
-    x = Conv2D(filters, kernel_size=(3, 3), padding="same")(x)
+    x = conv(filters, kernel_size=(3, 3), padding="same")(x)
     x = BatchNormalization(axis=3)(x)
 
     x = Add()([x, x_shortcut])
@@ -29,14 +35,15 @@ def convolutional_block(x, filters, strides=(2, 2)):
     return x
 
 
-def identity_block(x, filters):
+def identity_block(x, filters, separable=False):
+    conv = SeparableConv2D if separable else Conv2D
     x_shortcut = x
 
-    x = Conv2D(filters, kernel_size=(3, 3), padding="same")(x)
+    x = conv(filters, kernel_size=(3, 3), padding="same")(x)
     x = BatchNormalization(axis=3)(x)
     x = Activation("relu")(x)
 
-    x = Conv2D(filters, kernel_size=(3, 3), padding="same")(x)
+    x = conv(filters, kernel_size=(3, 3), padding="same")(x)
     x = BatchNormalization(axis=3)(x)
 
     x = Add()([x, x_shortcut])
@@ -44,28 +51,105 @@ def identity_block(x, filters):
     return x
 
 
-def ResNet34(input_shape=(28, 28, 1), classes=345):
-    x_input = Input(input_shape)
-    x = ZeroPadding2D((3, 3))(x_input)
+def stage_filters(stage: int, width_multiplier: float) -> int:
+    # 64, 128, 256... mis à l'échelle et arrondis au multiple de 8
+    return max(8, int(round(64 * 2**stage * width_multiplier / 8)) * 8)
+
+
+def _stem(x, stem, width_multiplier):
+    if stem == "imagenet":
+        x = ZeroPadding2D((3, 3))(x)
+        x = Conv2D(stage_filters(0, width_multiplier), (7, 7), strides=(2, 2), padding="same")(x)
+        x = BatchNormalization(axis=3)(x)
+        x = Activation("relu")(x)
+        x = MaxPooling2D((3, 3), strides=(2, 2), padding="same")(x)
+    else:
+        # Sur du 28x28, on garde la pleine résolution pour le premier étage
+        x = Conv2D(stage_filters(0, width_multiplier), (3, 3), padding="same")(x)
+        x = BatchNormalization(axis=3)(x)
+        x = Activation("relu")(x)
+    return x
 
-    x = Conv2D(64, (7, 7), strides=(2, 2), padding="same")(x)
-    x = BatchNormalization(axis=3)(x)
-    x = Activation("relu")(x)
-    x = MaxPooling2D((3, 3), strides=(2, 2), padding="same")(x)
 
-    stages = [(64, 3), (128, 4), (256, 6), (512, 3)]
+def _stage(x, stage, blocks, width_multiplier, separable):
+    filters = stage_filters(stage, width_multiplier)
+    strides = (1, 1) if stage == 0 else (2, 2)
+    x = convolutional_block(x, filters, strides=strides, separable=separable)
 
-    for filters, blocks in stages:
-        strides = (1, 1) if filters == 64 else (2, 2)
-        x = convolutional_block(x, filters, strides=strides)
+    for _ in range(blocks - 1):
+        x = identity_block(x, filters, separable=separable)
+    return x
 
-        for _ in range(blocks - 1):
-            x = identity_block(x, filters)
 
-    x = AveragePooling2D((2, 2), padding="same")(x)
-    x = Flatten()(x)
-    x = Dense(512, activation="relu")(x)
-    x = Dense(classes, activation="softmax")(x)
+def _classifier(x, classes, head):
+    if head == "dense":
+        x = AveragePooling2D((2, 2), padding="same")(x)
+        x = Flatten()(x)
+        x = Dense(512, activation="relu")(x)
+    else:
+        x = GlobalAveragePooling2D()(x)
+    # Softmax en float32 même en précision mixte, pour la stabilité de la perte
+    return Dense(classes, activation="softmax", dtype="float32")(x)
+
+
+def ResNet(
+    input_shape=(28, 28, 1),
+    classes=345,
+    stage_depths=(3, 4, 6, 3),
+    width_multiplier=1.0,
+    stem="imagenet",
+    block="basic",
+    head="dense",
+    early_exits=False,
+    name="ResNet",
+):
+    separable = block == "separable"
+    x_input = Input(input_shape)
 
-    model = Model(inputs=x_input, outputs=x, name="ResNet34")
+    if not early_exits:
+        x = _stem(x_input, stem, width_multiplier)
+        for stage, blocks in enumerate(stage_depths):
+            x = _stage(x, stage, blocks, width_multiplier, separable)
+
+        model = Model(inputs=x_input, outputs=_classifier(x, classes, head), name=name)
+        return model
+
+    # Un sous-modèle "exit_<n>" par étage, qui renvoie ses cartes et sa prédiction :
+    # l'inférence peut s'arrêter après n'importe quel étage sans calculer les suivants
+    x, outputs = x_input, []
+    for stage, blocks in enumerate(stage_depths):
+        segment_input = Input(x.shape[1:], dtype=x.dtype)
+        features = _stem(segment_input, stem, width_multiplier) if stage == 0 else segment_input
+        features = _stage(features, stage, blocks, width_multiplier, separable)
+
+        if stage == len(stage_depths) - 1:
+            segment = Model(segment_input, _classifier(features, classes, head), name=f"exit_{stage + 1}")
+            outputs.append(segment(x))
+        else:
+            # Les têtes intermédiaires restent légères : moyenne globale puis couche dense
+            probabilities = _classifier(features, classes, "gap")
+            segment = Model(segment_input, [features, probabilities], name=f"exit_{stage + 1}")
+            x, probabilities = segment(x)
+            outputs.append(probabilities)
+
+    model = Model(inputs=x_input, outputs=outputs, name=name)
     return model
+
+
+def ResNet34(input_shape=(28, 28, 1), classes=345):
+    return ResNet(input_shape, classes, name="ResNet34")
+
+
+def build_resnet(config: Config) -> Model:
+    architecture = config.architecture
+    return ResNet(
+        config.input_shape,
+        len(config.data.classes),
+        stage_depths=architecture.stage_depths,
+        width_multiplier=architecture.width_multiplier,
+        stem=architecture.stem,
+        block=architecture.block,
+        head=architecture.head,
+        early_exits=config.early_exits is not None,
+        name="ResNet34" if architecture.preset == "resnet34" else architecture.preset,
+    )
@@ -1,11 +1,55 @@
+import math
 from typing import Any, Literal
 
-from focal_loss import SparseCategoricalFocalLoss
-from pydantic import BaseModel, Field, validator
-from quickdraw import QuickDrawData
-from keras.losses import SparseCategoricalCrossentropy
+import yaml
+from pydantic import BaseModel, Field, root_validator, validator
 from pathlib import Path
 
+from catalog import load_class_names
+
+# Architectures prédéfinies, chaque champ peut être surchargé dans la configuration
+ARCHITECTURE_PRESETS: dict[str, dict[str, Any]] = {
+    "resnet34": {
+        "stage_depths": [3, 4, 6, 3],
+        "width_multiplier": 1.0,
+        "stem": "imagenet",
+        "block": "basic",
+        "head": "dense",
+    },
+    "resnet18": {
+        "stage_depths": [2, 2, 2, 2],
+        "width_multiplier": 1.0,
+        "stem": "small",
+        "block": "basic",
+        "head": "gap",
+    },
+    "compact": {
+        "stage_depths": [2, 2, 2],
+        "width_multiplier": 0.5,
+        "stem": "small",
+        "block": "basic",
+        "head": "gap",
+    },
+    "mobile": {
+        "stage_depths": [2, 2, 2],
+        "width_multiplier": 0.5,
+        "stem": "small",
+        "block": "separable",
+        "head": "gap",
+    },
+    "tiny": {
+        "stage_depths": [1, 1, 1],
+        "width_multiplier": 0.25,
+        "stem": "small",
+        "block": "separable",
+        "head": "gap",
+    },
+}
+MAX_STAGES = 5
+
+# Une trace du profileur TensorFlow grossit vite, on borne la fenêtre capturée
+MAX_TRACE_STEPS = 50
+
 
 class WandbParameters(BaseModel):
     project_name: str = Field(min_length=1)
@@ -13,19 +57,31 @@ class WandbParameters(BaseModel):
     log_batch_fequency: int | None = None
 
 
+class RawData(BaseModel):
+    cache_folder: Path = Path("./.quickdrawcache")
+    base_url: str = "https://storage.googleapis.com/quickdraw_dataset/full/binary/"
+    offline: bool = False
+
+
 class Data(BaseModel):
     folder: Path = Field(min_length=1)
     generate: bool = True
+    format: Literal["png", "packed", "strokes"] = "png"
+    renderer: Literal["pil", "numpy"] = "pil"
+    stroke_width: int = Field(default=1, ge=1)
+    loader: Literal["keras", "tf_data"] = "keras"
+    cache: str | None = None
+    shuffle_buffer: int = Field(default=10000, ge=1)
     train_samples: int
     validation_samples: int
     test_samples: int
     batch_size: int = Field(ge=1)
+    workers: int = Field(default=1, ge=1)
     classes: list[str] = Field(min_items=2)
 
     @validator("classes", pre=True, always=True)
     def verify_classes_names(cls, classes):
-        qd = QuickDrawData()
-        available_classes = set(qd.drawing_names)
+        available_classes = load_class_names()
         invalid_classes = set(classes) - available_classes
 
         if invalid_classes:
@@ -34,6 +90,98 @@ class Data(BaseModel):
         return classes
 
 
+class Architecture(BaseModel):
+    preset: Literal["resnet34", "resnet18", "compact", "mobile", "tiny"] = "resnet34"
+    stage_depths: list[int] | None = None
+    width_multiplier: float | None = Field(default=None, gt=0, le=4)
+    stem: Literal["imagenet", "small"] | None = None
+    block: Literal["basic", "separable"] | None = None
+    head: Literal["dense", "gap"] | None = None
+
+    @validator("stage_depths")
+    def verify_stage_depths(cls, stage_depths):
+        if stage_depths is None:
+            return stage_depths
+
+        if not 1 <= len(stage_depths) <= MAX_STAGES:
+            raise ValueError(f"stage_depths must define between 1 and {MAX_STAGES} stages.")
+        if any(depth < 1 for depth in stage_depths):
+            raise ValueError("Each stage needs at least one block.")
+
+        return stage_depths
+
+    @root_validator(skip_on_failure=True)
+    def apply_preset(cls, values):
+        for name, value in ARCHITECTURE_PRESETS[values["preset"]].items():
+            if values.get(name) is None:
+                values[name] = value
+
+        return values
+
+
+class EarlyExits(BaseModel):
+    # Poids de la perte de chaque sortie, de la tête du premier étage à la tête finale
+    loss_weights: list[float] | None = None
+    threshold: float = Field(default=0.9, gt=0, le=1)
+
+    @validator("loss_weights")
+    def verify_loss_weights(cls, loss_weights):
+        if loss_weights is None:
+            return loss_weights
+
+        if any(weight < 0 for weight in loss_weights) or not any(weight > 0 for weight in loss_weights):
+            raise ValueError("The exit loss weights must be non-negative, with at least one positive weight.")
+
+        return loss_weights
+
+
+class StrokeModel(BaseModel):
+    length: int = Field(default=64, ge=8)
+    simplify_epsilon: float = Field(default=2.0, ge=0)
+    encoder: Literal["conv1d", "gru"] = "conv1d"
+    filters: int = Field(default=64, ge=8)
+    blocks: int = Field(default=3, ge=1)
+
+
+class Profiling(BaseModel):
+    log_interval: int = Field(default=50, ge=1)
+    output: Path | None = None
+    trace_steps: tuple[int, int] | None = None
+    trace_folder: Path = Path("./logs/trace")
+
+    @validator("trace_steps")
+    def verify_trace_steps(cls, trace_steps):
+        if trace_steps is None:
+            return trace_steps
+
+        start, end = trace_steps
+        if start < 0 or end < start:
+            raise ValueError("trace_steps must be a (start, end) range of training steps with 0 <= start <= end.")
+        if end - start >= MAX_TRACE_STEPS:
+            raise ValueError(f"A profiler trace is limited to {MAX_TRACE_STEPS} steps.")
+
+        return trace_steps
+
+
+class Training(BaseModel):
+    jit_compile: bool = False
+    steps_per_execution: int = Field(default=1, ge=1)
+    precision: Literal["float32", "mixed_bfloat16"] = "float32"
+
+
+class Checkpointing(BaseModel):
+    folder: Path = Path("./checkpoints")
+    save_steps: int | None = Field(default=None, ge=1)
+    max_to_keep: int = Field(default=3, ge=1)
+    async_write: bool = True
+
+
+class Distribution(BaseModel):
+    strategy: Literal["none", "multi_worker"] = "none"
+    batch_size: Literal["global", "per_replica"] = "global"
+    communication: Literal["auto", "ring"] = "auto"
+
+
 class Config(BaseModel):
     run_name: str | None = None
 
@@ -41,22 +189,181 @@ class Config(BaseModel):
 
     loss_name: Literal["focal", "cross_entropy"]
     loss_parameters: dict[str, Any] | None = None
-    loss: Any = None
 
-    @validator("loss", pre=True, always=True)
-    def convert_loss_name_to_instance(cls, loss, values):
-        loss_name = values.get("loss_name")
-        loss_parameters = values.get("loss_parameters") or {}
-        if loss_name == "focal":
+    # La perte n'est construite qu'à l'entraînement, l'inférence n'a besoin ni de keras.losses ni de focal_loss
+    def build_loss(self) -> Any:
+        loss_parameters = self.loss_parameters or {}
+        if self.loss_name == "focal":
+            from focal_loss import SparseCategoricalFocalLoss
+
             return SparseCategoricalFocalLoss(**loss_parameters)
-        elif loss_name == "cross_entropy":
+        elif self.loss_name == "cross_entropy":
+            from keras.losses import SparseCategoricalCrossentropy
+
             return SparseCategoricalCrossentropy(**loss_parameters)
         else:
-            raise ValueError(f"Loss '{loss_name}' is not recognized.")
+            raise ValueError(f"Loss '{self.loss_name}' is not recognized.")
 
     epochs: int = Field(ge=1)
     learning_rate: float = Field(ge=0)
 
+    @property
+    def input_shape(self) -> tuple[int, ...]:
+        # Le format "strokes" remplace l'image par une séquence de points rééchantillonnés
+        if self.data.format == "strokes":
+            from strokes import POINT_FEATURES
+
+            return (self.strokes.length, POINT_FEATURES)
+        return (self.image_size[1], self.image_size[0], 1)
+
+    architecture: Architecture = Field(default_factory=Architecture)
+    early_exits: EarlyExits | None = None
+    strokes: StrokeModel = Field(default_factory=StrokeModel)
+
     wandb_parameters: WandbParameters | None = None
 
+    raw_data: RawData = Field(default_factory=RawData)
+
+    training: Training = Field(default_factory=Training)
+
+    profiling: Profiling | None = None
+
+    checkpointing: Checkpointing | None = None
+
+    distribution: Distribution = Field(default_factory=Distribution)
+
     data: Data
+
+    @validator("architecture")
+    def verify_architecture(cls, architecture, values):
+        image_size = values.get("image_size")
+        if image_size is None:
+            return architecture
+
+        # La souche "imagenet" divise la résolution par quatre, puis chaque étage après le premier par deux
+        size = math.ceil(min(image_size) / (4 if architecture.stem == "imagenet" else 1))
+        sizes = [size]
+        for _ in architecture.stage_depths[1:]:
+            sizes.append(math.ceil(sizes[-1] / 2))
+
+        if sizes.count(1) > 1:
+            raise ValueError(
+                f"With a {image_size} input, {sizes.count(1)} stages run on 1x1 feature maps."
+                " Use fewer stages or the small stem."
+            )
+
+        return architecture
+
+    @root_validator(skip_on_failure=True)
+    def verify_early_exits(cls, values):
+        early_exits = values["early_exits"]
+        if early_exits is None:
+            return values
+
+        if values["data"].format == "strokes":
+            raise ValueError("Early exits are heads on the ResNet stages, they do not apply to stroke-sequence models.")
+        n_stages = len(values["architecture"].stage_depths)
+        if early_exits.loss_weights is not None and len(early_exits.loss_weights) != n_stages:
+            raise ValueError(f"early_exits.loss_weights needs one weight per stage, {n_stages} with this architecture.")
+
+        return values
+
+    @root_validator(skip_on_failure=True)
+    def verify_distribution(cls, values):
+        if values["distribution"].strategy == "none":
+            return values
+
+        if values["data"].loader != "tf_data":
+            raise ValueError("Multi-worker training shards the data with tf.data, set data.loader to 'tf_data'.")
+        if values["profiling"] is not None:
+            raise ValueError("The training profiler measures a single process, disable it for multi-worker training.")
+        if values["checkpointing"] is not None:
+            raise ValueError(
+                "Full-state checkpoints are written by a single process, disable them for multi-worker training."
+            )
+
+        return values
+
+    @root_validator(skip_on_failure=True)
+    def verify_profiling(cls, values):
+        if values["profiling"] is not None and values["training"].steps_per_execution > 1:
+            raise ValueError(
+                "The training profiler times each batch, set training.steps_per_execution to 1 to profile."
+            )
+
+        return values
+
+
+def get_config(config_path: Path) -> Config:
+    with open(config_path, "r") as config_file:
+        config_data = yaml.safe_load(config_file)
+
+    config = Config(**config_data)
+
+    return config
+
+
+class SweepParameter(BaseModel):
+    values: list[Any] | None = None
+    min: float | None = None
+    max: float | None = None
+    log: bool = False
+    integer: bool = False
+
+    @root_validator(skip_on_failure=True)
+    def verify_space(cls, values):
+        is_range = values["min"] is not None or values["max"] is not None
+        if (values["values"] is None) == (not is_range):
+            raise ValueError("A sweep parameter takes either a list of values or a min and max range.")
+
+        if values["values"] is not None:
+            if not values["values"]:
+                raise ValueError("A sweep parameter needs at least one value.")
+            return values
+
+        if values["min"] is None or values["max"] is None or values["min"] > values["max"]:
+            raise ValueError("A sweep range needs a min lower than or equal to its max.")
+        if values["log"] and values["min"] <= 0:
+            raise ValueError("A log-uniform sweep range must be positive.")
+
+        return values
+
+
+class Halving(BaseModel):
+    min_epochs: int = Field(default=1, ge=1)
+    eta: int = Field(default=3, ge=2)
+    max_epochs: int | None = Field(default=None, ge=1)
+
+
+class Sweep(BaseModel):
+    name: str = Field(default="sweep", min_length=1)
+    output_folder: Path = Path("./sweeps")
+    trials: int | None = Field(default=None, ge=1)
+    seed: int = 0
+    workers: int | None = Field(default=None, ge=1)
+    # Les pertes focale et d'entropie croisée ne sont pas comparables : val_accuracy si loss_name varie
+    metric: Literal["val_loss", "val_accuracy"] = "val_loss"
+    halving: Halving = Field(default_factory=Halving)
+    parameters: dict[str, SweepParameter]
+
+    @validator("parameters")
+    def verify_parameters(cls, parameters):
+        if not parameters:
+            raise ValueError("A sweep needs at least one parameter.")
+
+        return parameters
+
+    @root_validator(skip_on_failure=True)
+    def verify_trials(cls, values):
+        # Sans nombre d'essais, la recherche parcourt la grille complète des valeurs
+        if values["trials"] is None and any(parameter.values is None for parameter in values["parameters"].values()):
+            raise ValueError("Set the number of trials to sample parameters from a min and max range.")
+
+        return values
+
+
+def get_sweep(sweep_path: Path) -> Sweep:
+    with open(sweep_path, "r") as sweep_file:
+        sweep_data = yaml.safe_load(sweep_file)
+
+    return Sweep(**sweep_data)
@@ -0,0 +1,54 @@
+from keras.layers import (
+    Activation,
+    BatchNormalization,
+    Bidirectional,
+    Conv1D,
+    Dense,
+    GlobalAveragePooling1D,
+    GRU,
+    Input,
+    MaxPooling1D,
+)
+from keras.models import Model
+
+from schemas import Config
+
+
+def conv1d_block(x, filters):
+    x = Conv1D(filters, kernel_size=5, padding="same")(x)
+    x = BatchNormalization()(x)
+    x = Activation("relu")(x)
+
+    x = Conv1D(filters, kernel_size=3, padding="same")(x)
+    x = BatchNormalization()(x)
+    x = Activation("relu")(x)
+    return MaxPooling1D(2, padding="same")(x)
+
+
+def StrokeEncoder(input_shape=(64, 3), classes=345, encoder="conv1d", filters=64, blocks=3):
+    x_input = Input(input_shape)
+    x = x_input
+
+    if encoder == "conv1d":
+        for block in range(blocks):
+            x = conv1d_block(x, filters * 2**block)
+        x = GlobalAveragePooling1D()(x)
+    else:
+        for block in range(blocks):
+            x = Bidirectional(GRU(filters, return_sequences=block < blocks - 1))(x)
+
+    # Softmax en float32 même en précision mixte, pour la stabilité de la perte
+    x = Dense(classes, activation="softmax", dtype="float32")(x)
+
+    model = Model(inputs=x_input, outputs=x, name=f"StrokeEncoder_{encoder}")
+    return model
+
+
+def build_stroke_encoder(config: Config) -> Model:
+    return StrokeEncoder(
+        config.input_shape,
+        len(config.data.classes),
+        encoder=config.strokes.encoder,
+        filters=config.strokes.filters,
+        blocks=config.strokes.blocks,
+    )
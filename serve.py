@@ -0,0 +1,187 @@
+import os
+
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "2"
+
+import json  # noqa: E402
+from argparse import ArgumentParser  # noqa: E402
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # noqa: E402
+from pathlib import Path  # noqa: E402
+from typing import Any  # noqa: E402
+
+import numpy as np  # noqa: E402
+
+from canvas import Canvas, ink_bbox  # noqa: E402
+from inference import MicroBatcher, ModelManager, PredictionCache  # noqa: E402
+from schemas import get_config  # noqa: E402
+
+
+def read_strokes(payload: dict[str, Any]) -> list[list[list[float]]]:
+    # Format QuickDraw : une liste de traits [[x0, x1, ...], [y0, y1, ...]], éventuellement suivis des temps
+    strokes = payload.get("drawing", payload.get("strokes"))
+    if not isinstance(strokes, list) or not all(
+        isinstance(stroke, list)
+        and len(stroke) >= 2
+        and isinstance(stroke[0], list)
+        and isinstance(stroke[1], list)
+        and len(stroke[0]) == len(stroke[1])
+        for stroke in strokes
+    ):
+        raise ValueError("Strokes must be a list of [[x0, x1, ...], [y0, y1, ...]] lists.")
+    if not any(len(stroke[0]) for stroke in strokes):
+        raise ValueError("The drawing is empty.")
+
+    return strokes
+
+
+def preprocess_request(model_manager: ModelManager, payload: dict[str, Any]) -> np.ndarray:
+    if not isinstance(payload, dict):
+        raise ValueError("Expected a JSON object.")
+
+    if model_manager.uses_strokes:
+        if "drawing" not in payload and "strokes" not in payload:
+            raise ValueError("This model reads QuickDraw 'drawing' strokes, not pixels.")
+        strokes = read_strokes(payload)
+        return model_manager.preprocess_strokes([list(zip(stroke[0], stroke[1])) for stroke in strokes])
+
+    if "pixels" in payload:
+        # Image en lignes/colonnes, fond blanc à 255 : le canevas est indexé en [x, y]
+        pixels = np.asarray(payload["pixels"], dtype=np.uint8).T
+        bbox = ink_bbox(pixels)
+    elif "drawing" in payload or "strokes" in payload:
+        canvas = Canvas.from_strokes(read_strokes(payload))
+        pixels, bbox = canvas.pixels, canvas.bbox
+    else:
+        raise ValueError("Expected a 'pixels' array or QuickDraw 'drawing' strokes.")
+
+    if bbox is None:
+        raise ValueError("The drawing is empty.")
+
+    return model_manager.preprocess(pixels, bbox)
+
+
+def format_prediction(prediction: tuple[str, float]) -> dict[str, Any]:
+    class_name, probability = prediction
+    return {"class": class_name, "probability": probability}
+
+
+def make_handler(model_manager: ModelManager, batcher: MicroBatcher) -> type[BaseHTTPRequestHandler]:
+    class PredictionHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, body: dict[str, Any]) -> None:
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self) -> None:
+            if self.path == "/stats":
+                self._send_json(200, batcher.stats())
+            else:
+                self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+        def do_POST(self) -> None:
+            if self.path != "/predict":
+                self._send_json(404, {"error": f"Unknown path {self.path}"})
+                return
+
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                arr = preprocess_request(model_manager, payload)
+            except (ValueError, TypeError, LookupError) as e:
+                self._send_json(400, {"error": str(e)})
+                return
+
+            try:
+                prediction = batcher.predict(arr)
+            except Exception as e:
+                # Erreur du modèle, transmise par le micro-batch : la requête échoue, le serveur continue
+                self._send_json(500, {"error": f"Prediction failed: {e}"})
+                return
+
+            self._send_json(200, format_prediction(prediction))
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    return PredictionHandler
+
+
+def serve(model_manager: ModelManager, host: str, port: int, max_batch_size: int, max_wait: float) -> None:
+    batcher = MicroBatcher(model_manager, max_batch_size, max_wait)
+    batcher.start()
+
+    server = ThreadingHTTPServer((host, port), make_handler(model_manager, batcher))
+    print(f"Serving predictions on http://{host}:{port}/predict (stats on /stats)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(batcher.stats(), indent=2))
+
+
+def predict_file(model_manager: ModelManager, input_path: Path, output_path: Path | None, batch_size: int) -> None:
+    with open(input_path, "r") as input_file:
+        lines = [line for line in input_file if line.strip()]
+
+    # Un enregistrement invalide a sa ligne d'erreur, les autres sont prédits
+    outputs: list[dict[str, Any]] = []
+    arrs: dict[int, np.ndarray] = {}
+    for i, line in enumerate(lines):
+        output: dict[str, Any] = {}
+        try:
+            record = json.loads(line)
+            if isinstance(record, dict) and "key_id" in record:
+                output["key_id"] = record["key_id"]
+            arrs[i] = preprocess_request(model_manager, record)
+        except (ValueError, TypeError, LookupError) as e:
+            output["error"] = str(e)
+        outputs.append(output)
+
+    indices = list(arrs)
+    for start in range(0, len(indices), batch_size):
+        chunk = indices[start : start + batch_size]
+        predictions = model_manager.predict_batch(np.stack([arrs[i] for i in chunk]))
+        for i, prediction in zip(chunk, predictions):
+            outputs[i].update(format_prediction(prediction))
+
+    lines = [json.dumps(output) for output in outputs]
+    if output_path is None:
+        print("\n".join(lines))
+    else:
+        output_path.write_text("\n".join(lines) + "\n")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(prog="Tiny Quick Draw server")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="Run the HTTP prediction server")
+    file_parser = subparsers.add_parser("predict-file", help="Predict every drawing of an NDJSON file")
+    file_parser.add_argument("input_path", type=Path)
+    file_parser.add_argument("--output", default=None, type=Path)
+
+    for subparser in (serve_parser, file_parser):
+        subparser.add_argument("model_path", nargs="?", default="best_model.keras", type=Path)
+        subparser.add_argument("config_path", nargs="?", default="config.yaml", type=Path)
+        subparser.add_argument("--max-batch-size", default=32, type=int)
+        subparser.add_argument("--backend", choices=["keras", "tflite"], default=None)
+        subparser.add_argument("--cache-size", default=4096, type=int, help="Cached predictions, 0 to disable")
+
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", default=8000, type=int)
+    serve_parser.add_argument("--max-wait-ms", default=5.0, type=float)
+
+    args = parser.parse_args()
+
+    config = get_config(args.config_path)
+    backend = args.backend or ("tflite" if args.model_path.suffix == ".tflite" else "keras")
+    cache = PredictionCache(args.cache_size) if args.cache_size > 0 else None
+    model_manager = ModelManager(args.model_path, config, backend=backend, cache=cache)
+
+    if args.command == "serve":
+        serve(model_manager, args.host, args.port, args.max_batch_size, args.max_wait_ms / 1000)
+    else:
+        predict_file(model_manager, args.input_path, args.output, args.max_batch_size)
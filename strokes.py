@@ -0,0 +1,87 @@
+from typing import Sequence
+
+import numpy as np
+
+from raster import Strokes
+
+# Chaque point encodé : x, y centrés et mis à l'échelle du dessin, puis 1 sur le dernier point d'un trait
+POINT_FEATURES = 3
+# Plus grande dimension d'un dessin QuickDraw simplifié
+QUICKDRAW_EXTENT = 255.0
+
+
+def simplify_stroke(points: np.ndarray, epsilon: float) -> np.ndarray:
+    # Ramer-Douglas-Peucker itératif, comme la simplification des données QuickDraw
+    if len(points) < 3 or epsilon <= 0:
+        return points
+
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    ranges = [(0, len(points) - 1)]
+
+    while ranges:
+        start, end = ranges.pop()
+        if end - start < 2:
+            continue
+
+        direction = points[end] - points[start]
+        offsets = points[start + 1 : end] - points[start]
+        norm = np.hypot(*direction)
+        if norm == 0:
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            distances = np.abs(direction[0] * offsets[:, 1] - direction[1] * offsets[:, 0]) / norm
+
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > epsilon:
+            split = start + 1 + farthest
+            keep[split] = True
+            ranges += [(start, split), (split, end)]
+
+    return points[keep]
+
+
+def _resample(points: np.ndarray, n_points: int) -> np.ndarray:
+    lengths = np.concatenate([[0.0], np.cumsum(np.hypot(*np.diff(points, axis=0).T))])
+    if lengths[-1] == 0:
+        return np.repeat(points[:1], n_points, axis=0)
+
+    targets = np.linspace(0, lengths[-1], n_points)
+    return np.stack([np.interp(targets, lengths, points[:, 0]), np.interp(targets, lengths, points[:, 1])], axis=1)
+
+
+def encode_strokes(strokes: Strokes, length: int, simplify_epsilon: float = 2.0) -> np.ndarray:
+    encoded = np.zeros((length, POINT_FEATURES), dtype=np.float32)
+
+    polylines = [np.asarray(stroke, dtype=np.float32).reshape(-1, 2) for stroke in strokes]
+    polylines = [points for points in polylines if len(points)]
+    if not polylines:
+        return encoded
+
+    # Ramené au cadre des données QuickDraw (coin en haut à gauche, plus grande dimension à 255) avant la
+    # simplification : simplify_epsilon a la même unité pour les données d'entraînement et les pixels de l'interface
+    all_points = np.concatenate(polylines)
+    origin = all_points.min(axis=0)
+    frame_scale = QUICKDRAW_EXTENT / max(float((all_points.max(axis=0) - origin).max()), 1.0)
+    polylines = [simplify_stroke((points - origin) * frame_scale, simplify_epsilon) for points in polylines][:length]
+
+    # Les points sont répartis entre les traits selon leur longueur, au moins un par trait
+    stroke_lengths = np.array([np.hypot(*np.diff(points, axis=0).T).sum() for points in polylines]) + 1e-3
+    counts = np.maximum(1, np.floor(length * stroke_lengths / stroke_lengths.sum()).astype(np.int64))
+    while counts.sum() > length:
+        counts[np.argmax(counts)] -= 1
+    counts[np.argmax(stroke_lengths)] += length - counts.sum()
+
+    resampled = np.concatenate([_resample(points, count) for points, count in zip(polylines, counts)])
+    ends = np.cumsum(counts) - 1
+
+    # Invariance à la position et à la taille, comme le recadrage de l'image
+    low, high = resampled.min(axis=0), resampled.max(axis=0)
+    scale = max(float((high - low).max()), 1.0)
+    encoded[:, :2] = (resampled - (low + high) / 2) / scale
+    encoded[ends, 2] = 1
+    return encoded
+
+
+def encode_drawings(drawings: Sequence[Strokes], length: int, simplify_epsilon: float = 2.0) -> np.ndarray:
+    return np.stack([encode_strokes(strokes, length, simplify_epsilon) for strokes in drawings])
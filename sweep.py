@@ -0,0 +1,327 @@
+import copy
+import csv
+import hashlib
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import random
+import sys
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, get_args
+
+import yaml
+from pydantic import BaseModel, ValidationError
+
+from schemas import Checkpointing, Config, Sweep, SweepParameter, get_sweep
+
+RESULTS_FILE = "results.csv"
+BEST_CONFIG_FILE = "best_config.yaml"
+METRICS = ("val_loss", "val_accuracy", "test_loss", "test_accuracy")
+
+
+class Trial:
+    def __init__(self, index: int, assignment: dict[str, Any], config_data: dict[str, Any]):
+        self.index = index
+        self.assignment = assignment
+        self.config_data = config_data
+        self.config: Config | None = None
+        self.status = "running"
+        self.error: str | None = None
+        self.metrics: dict[str, float] = {}
+
+    def score(self, metric: str) -> float:
+        # Score à minimiser, un essai sans métrique ou divergé est classé dernier
+        value = self.metrics.get(metric, math.nan)
+        if math.isnan(value):
+            return math.inf
+        return -value if metric == "val_accuracy" else value
+
+
+def _field_model(annotation: Any) -> type[BaseModel] | None:
+    for candidate in (annotation, *get_args(annotation)):
+        if isinstance(candidate, type) and issubclass(candidate, BaseModel):
+            return candidate
+    return None
+
+
+def is_config_path(path: str) -> bool:
+    model: type[BaseModel] | None = Config
+    for name in path.split("."):
+        if model is None or name not in model.model_fields:
+            return False
+        model = _field_model(model.model_fields[name].annotation)
+    return True
+
+
+def verify_parameters(sweep: Sweep) -> None:
+    # Un paramètre qui n'est pas un champ de la configuration groupe plusieurs champs, chaque valeur les fixe ensemble
+    for name, parameter in sweep.parameters.items():
+        if is_config_path(name):
+            continue
+        if parameter.values is None or not all(isinstance(value, dict) for value in parameter.values):
+            raise ValueError(
+                f"'{name}' is not a configuration field: list its values as mappings of configuration fields."
+            )
+        for value in parameter.values:
+            invalid = [path for path in value if not is_config_path(path)]
+            if invalid:
+                raise ValueError(f"The values of '{name}' set unknown configuration fields: {', '.join(invalid)}")
+
+
+def _sample(parameter: SweepParameter, rng: random.Random) -> Any:
+    if parameter.values is not None:
+        return rng.choice(parameter.values)
+
+    if parameter.log:
+        value = math.exp(rng.uniform(math.log(parameter.min), math.log(parameter.max)))
+    else:
+        value = rng.uniform(parameter.min, parameter.max)
+    return round(value) if parameter.integer else value
+
+
+def sample_assignments(sweep: Sweep) -> list[dict[str, Any]]:
+    names = list(sweep.parameters)
+    if sweep.trials is None:
+        grid = itertools.product(*(sweep.parameters[name].values for name in names))
+        return [dict(zip(names, values)) for values in grid]
+
+    rng = random.Random(sweep.seed)
+    return [{name: _sample(sweep.parameters[name], rng) for name in names} for _ in range(sweep.trials)]
+
+
+def _set_path(data: dict[str, Any], path: str, value: Any) -> None:
+    *parents, name = path.split(".")
+    for parent in parents:
+        if not isinstance(data.get(parent), dict):
+            data[parent] = {}
+        data = data[parent]
+    data[name] = value
+
+
+def apply_assignment(config_data: dict[str, Any], assignment: dict[str, Any]) -> dict[str, Any]:
+    data = copy.deepcopy(config_data)
+    for name, value in assignment.items():
+        updates = {name: value} if is_config_path(name) else value
+        for path, field_value in updates.items():
+            _set_path(data, path, copy.deepcopy(field_value))
+    return data
+
+
+def _dataset_key(config: Config) -> str:
+    from data import _render_settings
+
+    # Deux essais partagent un jeu de données si tout ce qui détermine ses échantillons est identique
+    dataset = {
+        "settings": _render_settings(config),
+        "classes": sorted(config.data.classes),
+        "splits": [config.data.train_samples, config.data.validation_samples, config.data.test_samples],
+        "raw_data": config.raw_data.model_dump(mode="json"),
+    }
+    return hashlib.sha256(json.dumps(dataset, sort_keys=True).encode()).hexdigest()[:8]
+
+
+def prepare_datasets(base_config: Config, trials: list[Trial]) -> None:
+    from data import generate_data
+
+    base_key = _dataset_key(base_config)
+    folders: dict[str, Path] = {}
+    for trial in trials:
+        key = _dataset_key(trial.config)
+        if key != base_key and not base_config.data.generate:
+            trial.status, trial.error = "invalid", "changes the dataset while data.generate is false"
+            continue
+
+        if key not in folders:
+            # Le jeu de données de la configuration de base garde son dossier, les variantes (taille d'image...)
+            # sont générées à côté. Le manifeste rend la génération idempotente d'une recherche à l'autre
+            folder = base_config.data.folder
+            if key != base_key:
+                folder = folder.with_name(f"{folder.name}-{key}")
+            generate = key != base_key or base_config.data.generate
+            data = trial.config.data.model_copy(update={"folder": folder, "generate": generate})
+            generate_data(trial.config.model_copy(update={"data": data}))
+            folders[key] = folder
+
+        trial.config.data = trial.config.data.model_copy(update={"folder": folders[key], "generate": False})
+
+
+def run_trial(config: Config, resume: bool, threads: int, log_path: Path) -> dict[str, float]:
+    # Chaque essai écrit dans son propre fichier : les barres de progression ne s'entremêlent pas
+    with open(log_path, "a") as log_file:
+        os.dup2(log_file.fileno(), sys.stdout.fileno())
+        os.dup2(log_file.fileno(), sys.stderr.fileno())
+
+    os.environ["TF_CPP_MIN_LOG_LEVEL"] = "2"
+    import tensorflow as tf
+
+    # Les cœurs sont répartis entre les essais qui tournent en même temps
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(threads)
+
+    from train import training
+
+    try:
+        return training(config, resume=resume)
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+
+def run_rung(trials: list[Trial], epochs: int, resume: bool, workers: int, folder: Path) -> None:
+    workers = min(workers, len(trials))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    # TensorFlow n'est pas sûr après un fork : un processus neuf par essai, qui reprend son dernier checkpoint
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, max_tasks_per_child=1) as executor:
+        futures = {
+            executor.submit(
+                run_trial,
+                trial.config.model_copy(update={"epochs": epochs}),
+                resume,
+                threads,
+                folder / "logs" / f"{trial.config.run_name}.log",
+            ): trial
+            for trial in trials
+        }
+        for future in as_completed(futures):
+            trial = futures[future]
+            try:
+                trial.metrics = future.result()
+                print(
+                    f"{trial.config.run_name}: {trial.metrics['epochs']} epochs,"
+                    f" val_loss {trial.metrics['val_loss']:.4f}, val_accuracy {trial.metrics['val_accuracy']:.4f}"
+                )
+            except Exception as e:
+                trial.status, trial.error = "failed", f"{type(e).__name__}: {e}"
+                print(f"{trial.config.run_name}: failed, see {folder / 'logs' / f'{trial.config.run_name}.log'}")
+
+
+def successive_halving(sweep: Sweep, trials: list[Trial], max_epochs: int, folder: Path) -> None:
+    workers = sweep.workers or os.cpu_count() or 1
+    epochs = min(sweep.halving.min_epochs, max_epochs)
+    active = [trial for trial in trials if trial.status == "running"]
+    rung = 0
+    while active:
+        print(f"Rung {rung}: {len(active)} trials up to epoch {epochs} on {min(workers, len(active))} processes")
+        run_rung(active, epochs, rung > 0, workers, folder)
+        active = sorted(
+            [trial for trial in active if trial.status == "running"], key=lambda trial: trial.score(sweep.metric)
+        )
+        if epochs >= max_epochs:
+            for trial in active:
+                trial.status = "completed"
+            break
+
+        # Seul le meilleur tiers (pour eta = 3) continue, avec un budget d'époques multiplié par eta
+        kept = max(1, math.ceil(len(active) / sweep.halving.eta))
+        for trial in active[kept:]:
+            trial.status = f"pruned at epoch {epochs}"
+        active = active[:kept]
+        epochs = min(epochs * sweep.halving.eta, max_epochs)
+        rung += 1
+
+
+def _format(value: Any) -> str:
+    if isinstance(value, float):
+        return f"{value:.4g}"
+    if isinstance(value, dict):
+        return ",".join(f"{name}={_format(field_value)}" for name, field_value in value.items())
+    if isinstance(value, list):
+        return "x".join(_format(item) for item in value)
+    return str(value)
+
+
+def write_results(sweep: Sweep, trials: list[Trial], folder: Path) -> list[Trial]:
+    ranked = sorted(trials, key=lambda trial: (trial.status != "completed", trial.score(sweep.metric)))
+    names = list(sweep.parameters)
+    header = ["trial", *names, "status", "epochs", *METRICS]
+    rows = [
+        [
+            trial.index,
+            *(_format(trial.assignment[name]) for name in names),
+            trial.status if trial.error is None else f"{trial.status}: {trial.error}",
+            trial.metrics.get("epochs", 0),
+            *(f"{trial.metrics[metric]:.4f}" if metric in trial.metrics else "-" for metric in METRICS),
+        ]
+        for trial in ranked
+    ]
+
+    with open(folder / RESULTS_FILE, "w", newline="") as results_file:
+        writer = csv.writer(results_file)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+    widths = [max(len(str(cell)) for cell in column) + 2 for column in zip(header, *rows)]
+    for row in [header, *rows]:
+        print("".join(f"{str(cell):<{width}}" for cell, width in zip(row, widths)))
+
+    return ranked
+
+
+def run_sweep(sweep: Sweep, config_path: Path) -> int:
+    with open(config_path, "r") as config_file:
+        config_data = yaml.safe_load(config_file)
+
+    base_config = Config(**config_data)
+    if base_config.distribution.strategy != "none":
+        raise ValueError("Sweep trials train in single processes, set distribution.strategy to 'none'.")
+    verify_parameters(sweep)
+    max_epochs = sweep.halving.max_epochs or base_config.epochs
+
+    folder = sweep.output_folder / sweep.name
+    (folder / "logs").mkdir(parents=True, exist_ok=True)
+
+    trials = []
+    for index, assignment in enumerate(sample_assignments(sweep)):
+        trial = Trial(index, assignment, apply_assignment(config_data, assignment))
+        try:
+            trial.config = Config(**trial.config_data)
+        except ValidationError as e:
+            trial.status, trial.error = "invalid", str(e).replace("\n", " ")
+            trials.append(trial)
+            continue
+
+        trial.config.run_name = f"{sweep.name}-{index:03d}"
+        trial.config.profiling = None
+        # Chaque palier reprend l'essai à son dernier checkpoint au lieu de le réentraîner depuis le début
+        checkpointing = trial.config.checkpointing or Checkpointing()
+        trial.config.checkpointing = checkpointing.model_copy(
+            update={"folder": folder / "checkpoints", "max_to_keep": 1}
+        )
+        trials.append(trial)
+
+    prepare_datasets(base_config, [trial for trial in trials if trial.status == "running"])
+    loss_names = {trial.config.loss_name for trial in trials if trial.config is not None}
+    if len(loss_names) > 1 and sweep.metric == "val_loss":
+        print("Warning: the trials use different losses, their val_loss are not comparable. Set metric: val_accuracy.")
+    successive_halving(sweep, trials, max_epochs, folder)
+
+    ranked = write_results(sweep, trials, folder)
+    best = ranked[0]
+    if best.status != "completed":
+        print("No trial completed.")
+        return 1
+
+    # La meilleure configuration pointe vers le jeu de données sur lequel son essai a été entraîné
+    _set_path(best.config_data, "data.folder", str(best.config.data.folder))
+    _set_path(best.config_data, "epochs", max_epochs)
+    with open(folder / BEST_CONFIG_FILE, "w") as best_config_file:
+        yaml.safe_dump(best.config_data, best_config_file, sort_keys=False)
+    print(
+        f"Best trial: {best.config.run_name}, {sweep.metric} {best.metrics[sweep.metric]:.4f},"
+        f" config in {folder / BEST_CONFIG_FILE}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(prog="Hyperparameter sweep")
+    parser.add_argument("sweep_path", type=Path)
+    parser.add_argument("config_path", nargs="?", default="config.yaml", type=Path)
+    args = parser.parse_args()
+
+    sys.exit(run_sweep(get_sweep(args.sweep_path), args.config_path))
@@ -0,0 +1,9 @@
+import pytest
+
+from benchmarks.import_budget import ENTRY_POINTS, check
+
+
+# L'interface et le serveur démarrent sans charger l'entraînement, dans leur budget de temps d'import
+@pytest.mark.parametrize("module", ["quick_draw", "serve"])
+def test_entry_point_import_budget(module: str):
+    assert check(module, ENTRY_POINTS[module]) == []
@@ -0,0 +1,143 @@
+import json
+import os
+import random
+
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "2"
+
+from pathlib import Path  # noqa: E402
+
+import numpy as np  # noqa: E402
+import pytest  # noqa: E402
+import tensorflow as tf  # noqa: E402
+from keras.callbacks import Callback  # noqa: E402
+from PIL import Image  # noqa: E402
+
+import train  # noqa: E402
+from schemas import Config  # noqa: E402
+
+CLASSES = ["ant", "apple", "banana"]
+SPLITS = {"train": 40, "validation": 8, "test": 8}
+
+
+class Interrupt(Callback):
+    # Simule un arrêt brutal de l'entraînement après le lot step de l'époque epoch (au début de l'époque si step vaut 0)
+    def __init__(self, epoch: int, step: int):
+        super().__init__()
+        self.epoch = epoch
+        self.step = step
+
+    def on_epoch_begin(self, epoch: int, logs: dict | None = None) -> None:
+        self.current_epoch = epoch
+        if (epoch, 0) == (self.epoch, self.step):
+            raise KeyboardInterrupt
+
+    def on_train_batch_end(self, batch: int, logs: dict | None = None) -> None:
+        if (self.current_epoch, batch + 1) == (self.epoch, self.step):
+            raise KeyboardInterrupt
+
+
+def write_images(folder: Path) -> None:
+    rng = np.random.default_rng(0)
+    for subset, n_images in SPLITS.items():
+        for label, name in enumerate(CLASSES):
+            (folder / subset / name).mkdir(parents=True)
+            for i in range(n_images):
+                image = rng.random((28, 28)) < 0.1 + 0.2 * label
+                Image.fromarray(image.astype(np.uint8) * 255).save(folder / subset / name / f"{i}.png")
+
+
+def make_config(folder: Path, run_name: str) -> Config:
+    return Config(
+        run_name=run_name,
+        image_size=(28, 28),
+        loss_name="cross_entropy",
+        epochs=3,
+        learning_rate=0.01,
+        architecture={"preset": "tiny"},
+        checkpointing={"folder": folder / "checkpoints", "save_steps": 3, "async_write": False},
+        data={
+            "folder": folder / "data",
+            "generate": False,
+            "train_samples": SPLITS["train"] * len(CLASSES),
+            "validation_samples": SPLITS["validation"] * len(CLASSES),
+            "test_samples": SPLITS["test"] * len(CLASSES),
+            "batch_size": 16,
+            "classes": CLASSES,
+        },
+    )
+
+
+def final_state(config: Config) -> dict[str, np.ndarray]:
+    reader = tf.train.load_checkpoint(str(config.checkpointing.folder / config.run_name))
+    state = {name: reader.get_tensor(name) for name in reader.get_variable_to_shape_map()}
+    # L'état global de numpy dépend du fil de lecture de model.fit (voir rng_draws), il n'est pas comparé
+    host_state = json.loads(state.pop("host_state/.ATTRIBUTES/VARIABLE_VALUE"))
+    del host_state["global_rng"]["numpy"]
+    return state | {"host_state": np.array(json.dumps(host_state))}
+
+
+def rng_draws() -> tuple[float, float]:
+    # Tirages des générateurs globaux, identiques si leur état a été restauré avec le checkpoint. L'état global de
+    # numpy est aussi restauré, mais ImageDataGenerator y tire à chaque image dans le fil de lecture de model.fit
+    return random.random(), float(tf.random.get_global_generator().uniform([]))
+
+
+def run(
+    config: Config, monkeypatch: pytest.MonkeyPatch, resume: bool = False, interrupt: Interrupt | None = None
+) -> dict[str, float]:
+    get_callbacks = train.get_callbacks
+    if interrupt is not None:
+        monkeypatch.setattr(train, "get_callbacks", lambda *args: get_callbacks(*args) + [interrupt])
+
+    tf.keras.backend.clear_session()
+    tf.keras.utils.set_random_seed(0)
+    tf.random.set_global_generator(tf.random.Generator.from_seed(0))
+    try:
+        return train.training(config, resume=resume)
+    finally:
+        monkeypatch.setattr(train, "get_callbacks", get_callbacks)
+
+
+# 8 lots par époque, un checkpoint tous les 3 pas : reprises au lot 4 de la 2e époque et au début de la 3e
+@pytest.mark.parametrize("epoch, step", [(1, 6), (2, 0)])
+def test_resumed_run_matches_uninterrupted_run(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, epoch: int, step: int):
+    monkeypatch.chdir(tmp_path)
+    tf.config.experimental.enable_op_determinism()
+    write_images(tmp_path / "data")
+
+    uninterrupted = make_config(tmp_path, "uninterrupted")
+    expected_metrics = run(uninterrupted, monkeypatch)
+    expected_draws = rng_draws()
+
+    resumed = make_config(tmp_path, "resumed")
+    with pytest.raises(KeyboardInterrupt):
+        run(resumed, monkeypatch, interrupt=Interrupt(epoch, step))
+    metrics = run(resumed, monkeypatch, resume=True)
+
+    assert metrics == expected_metrics
+    assert rng_draws() == expected_draws
+    expected_state, state = final_state(uninterrupted), final_state(resumed)
+    assert state.keys() == expected_state.keys()
+    for name, value in expected_state.items():
+        np.testing.assert_array_equal(state[name], value, err_msg=name)
+
+
+# Le mélange de tf.data n'est pas sauvegardé : la reprise n'est identique qu'avec les chargeurs keras.
+# Avec tf_data, elle reprend au bon lot, mais l'époque reprise tire un nouvel ordre
+def test_tf_data_resume_continues_at_saved_step(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.chdir(tmp_path)
+    write_images(tmp_path / "data")
+
+    uninterrupted = make_config(tmp_path, "uninterrupted")
+    uninterrupted.data.loader = "tf_data"
+    expected_metrics = run(uninterrupted, monkeypatch)
+
+    resumed = make_config(tmp_path, "resumed")
+    resumed.data.loader = "tf_data"
+    with pytest.raises(KeyboardInterrupt):
+        run(resumed, monkeypatch, interrupt=Interrupt(1, 6))
+    metrics = run(resumed, monkeypatch, resume=True)
+
+    assert metrics["epochs"] == expected_metrics["epochs"]
+    iterations = "optimizer/_iterations/.ATTRIBUTES/VARIABLE_VALUE"
+    assert final_state(resumed)[iterations] == final_state(uninterrupted)[iterations]
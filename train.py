@@ -11,44 +11,130 @@ from common import (  # noqa: E402
     get_callbacks,
     get_config,
     close_wandb_session,
-    wandb_confusion_matrix,
+    wandb_log_evaluation,
 )
-from data import generate_data, get_train_val_datasets  # noqa: E402
+from checkpoints import TrainingCheckpoint, latest_run, read_run_info  # noqa: E402
+from data import generate_data, get_distributed_datasets, get_train_val_datasets, skip_batches  # noqa: E402
+from distributed import get_strategy, global_batch_size, is_chief, task_info  # noqa: E402
+from evaluation import evaluate_model  # noqa: E402
+from profiling import ThroughputProfiler  # noqa: E402
 
 
-def training(config) -> None:
+def training(config, resume: bool = False) -> dict[str, float]:
+    # La stratégie multi-worker doit être créée avant toute autre opération TensorFlow
+    strategy = get_strategy(config)
+    distributed = config.distribution.strategy != "none"
+
     generate_run_name(config)
-    generate_data(config)
+    # En multi-worker, les données sont générées avant de lancer les workers
+    if not distributed:
+        generate_data(config)
 
     train_gen, val_gen, test_gen = get_train_val_datasets(config)
+    train_data, val_data = train_gen, val_gen
+    if distributed:
+        worker_index, num_workers = task_info()
+        train_data, val_data, steps_per_epoch, validation_steps = get_distributed_datasets(
+            config, num_workers, worker_index, global_batch_size(config, strategy)
+        )
+    else:
+        steps_per_epoch, validation_steps = len(train_gen), len(val_gen)
 
-    model = generate_model(config)
+    with strategy.scope():
+        model = generate_model(config)
 
-    callbacks = get_callbacks(config)
+    wandb_run_id = read_run_info(config).get("wandb_run_id") if resume else None
+    callbacks = get_callbacks(config, wandb_run_id)
 
-    model.fit(
-        train_gen,
-        steps_per_epoch=train_gen.samples // train_gen.batch_size,
-        epochs=config.epochs,
-        validation_data=val_gen,
-        validation_steps=val_gen.samples // val_gen.batch_size,
-        callbacks=callbacks,
-        verbose=1,
-    )
+    # Reprise : modèle, optimiseur et ordre des données restaurés avant de relancer fit à la même époque
+    initial_epoch, initial_step = 0, 0
+    for callback in callbacks:
+        if isinstance(callback, TrainingCheckpoint):
+            callback.dataset = train_gen
+            if resume:
+                initial_epoch, initial_step = callback.restore(model, train_gen)
+
+    def fit(data, steps: int, epochs: int, first_epoch: int):
+        # Le profileur mesure l'attente des données en horodatant chaque lot produit
+        for callback in callbacks:
+            if isinstance(callback, ThroughputProfiler):
+                data = callback.instrument(data)
+
+        # Les chargeurs mélangent déjà leurs échantillons à chaque époque : l'ordre des lots n'est pas
+        # remélangé, pour qu'une époque reprise lise les mêmes lots
+        return model.fit(
+            data,
+            steps_per_epoch=steps,
+            epochs=epochs,
+            initial_epoch=first_epoch,
+            validation_data=val_data,
+            validation_steps=validation_steps,
+            callbacks=callbacks,
+            shuffle=False,
+            verbose=1 if is_chief() else 2,
+        )
+
+    # Une époque interrompue est terminée seule, à partir du lot sauvegardé, avant les suivantes
+    histories = []
+    if initial_step > 0:
+        remaining_data = skip_batches(train_data, initial_step)
+        histories.append(fit(remaining_data, steps_per_epoch - initial_step, initial_epoch + 1, initial_epoch))
+        initial_epoch += 1
+    if not model.stop_training:
+        histories.append(fit(train_data, steps_per_epoch, config.epochs, initial_epoch))
+    history = [history for history in histories if history.epoch][-1]
 
-    test_loss, test_accuracy = model.evaluate(test_gen, steps=test_gen.samples // test_gen.batch_size)
-    print(f"Test loss: {test_loss} - Test accuracy: {test_accuracy}")
+    if distributed:
+        # Lire les variables distribuées est une opération collective : tous les workers y participent,
+        # puis le chef évalue seul une copie locale du modèle
+        weights = model.get_weights()
+        if not is_chief():
+            return {}
+
+        model = generate_model(config)
+        model.set_weights(weights)
+
+    exit_threshold = config.early_exits.threshold if config.early_exits is not None else None
+    metrics = evaluate_model(model, test_gen, sorted(config.data.classes), exit_threshold)
+    print(metrics.summary())
 
     if config.wandb_parameters:
-        wandb_confusion_matrix(model, test_gen)
+        wandb_log_evaluation(metrics)
         close_wandb_session()
 
+    # Métriques de la dernière époque, comparées entre les essais d'une recherche d'hyperparamètres.
+    # Avec des sorties anticipées, la précision est celle de la tête finale
+    accuracy = "val_accuracy" if len(model.outputs) == 1 else f"val_{model.output_names[-1]}_accuracy"
+    return {
+        "epochs": history.epoch[-1] + 1,
+        "val_loss": history.history["val_loss"][-1],
+        "val_accuracy": history.history[accuracy][-1],
+        "test_loss": metrics.loss,
+        "test_accuracy": metrics.accuracy,
+    }
+
 
 if __name__ == "__main__":
     parser = ArgumentParser()
     parser.add_argument("config_path", nargs="?", default="config.yaml", type=Path)
+    parser.add_argument("--run-name", default=None, help="Defaults to the loss, learning rate, batch size and date")
+    parser.add_argument(
+        "--resume",
+        nargs="?",
+        const="latest",
+        default=None,
+        metavar="RUN_NAME",
+        help="Resume a run from its last checkpoint, the most recent run if no name is given",
+    )
 
     args = parser.parse_args()
     config = get_config(args.config_path)
+    if args.run_name is not None:
+        config.run_name = args.run_name
+
+    if args.resume is not None:
+        if config.checkpointing is None:
+            parser.error("Resuming a run needs the checkpointing section of the configuration.")
+        config.run_name = latest_run(config) if args.resume == "latest" else args.resume
 
-    training(config)
+    training(config, resume=args.resume is not None)